@@ -1,6 +1,8 @@
 # python 3
+import atexit
 import glob
 import os
+import threading
 
 from django.conf import settings
 from django.test.utils import override_settings
@@ -78,21 +80,61 @@ class GlobFilesGenerator:
         return next_elem
 
 
+# process-wide pools keyed by (host, port, db, pid), so forked workers never share sockets with parent
+_redis_pools = {}
+_redis_pools_lock = threading.Lock()
+
+
+def get_redis_pool():
+    """Shared redis connection pool of the current process
+
+    Settings:
+        REDIS_MAX_CONNECTIONS (int): max connections of pool, default 50
+        REDIS_POOL_TIMEOUT (float): seconds to wait for free connection, default 20
+    """
+    key = (settings.REDIS_HOST, settings.REDIS_PORT, settings.TMP_REDIS_CACHE_DB, os.getpid())
+    pool = _redis_pools.get(key)
+    if pool is None:
+        with _redis_pools_lock:
+            pool = _redis_pools.get(key)
+            if pool is None:
+                pool = _redis_pools[key] = redis.BlockingConnectionPool(
+                    host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.TMP_REDIS_CACHE_DB,
+                    max_connections=getattr(settings, 'REDIS_MAX_CONNECTIONS', 50),
+                    timeout=getattr(settings, 'REDIS_POOL_TIMEOUT', 20)
+                )
+    return pool
+
+
+def close_redis_pools():
+    """Disconnect shared redis pools of the current process, eg. on worker shutdown"""
+    with _redis_pools_lock:
+        pools = [pool for key, pool in _redis_pools.items() if key[-1] == os.getpid()]
+        _redis_pools.clear()
+
+    for pool in pools:
+        pool.disconnect()
+
+
+atexit.register(close_redis_pools)
+
+
 class RedisConn():
     """simple redis context manager
 
+    Connections come from shared pool of the current process and are not disconnected on exit.
+
     Usage:
         with RedisConn() as fastcache:
             fastcache.get(key)
     """
 
     def __init__(self):
-        self.r_conn = redis.ConnectionPool(host=settings.REDIS_HOST, port=settings.REDIS_PORT,
-                                           db=settings.TMP_REDIS_CACHE_DB)
+        self.r_conn = get_redis_pool()
         self.fastcache = redis.Redis(connection_pool=self.r_conn)
 
     def __enter__(self):
         return self.fastcache
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.r_conn.disconnect()
+        pass
@@ -0,0 +1,394 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    logging.error('You should install aiohttp lib: pip install aiohttp')
+
+try:
+    import google_auth_httplib2
+    import httplib2
+    from google.oauth2 import service_account
+except ImportError:
+    logging.error('You should install Google Api Client lib: pip install google-api-python-client==1.7.3')
+
+from api import GoogleDriveAPI
+from constants import DEFAULT_CONNECTION_LIMIT, DEFAULT_FIELDS, DEFAULT_MAX_RETRIES, MimeType
+from exceptions import EntryDoesNotExistGAPIException, MultipleObjectsReturnedGAPIException, \
+    ArgumentNotFoundGAPIException, ResponseFormatGAPIException, WrongInitGAPIException
+from instrumentation import record_call
+from rate_limit import backoff_delay, get_rate_limiter, is_quota_error, is_retryable_error
+from result_helpers import GoogleDriveResult
+
+
+class AsyncGoogleDriveListIterator:
+    """API results async iterator
+
+    Args:
+        gapi_instance (AsyncGoogleDriveAPI): api instance
+        query_params (dict): connection params
+
+    Example:
+        async for elem in gapi.folders.filter(name='test'):
+            pass
+
+        async for page in gapi.files.all().pages():
+            pass
+
+        elements = await gapi.files.all().list()
+    """
+
+    def __init__(self, gapi_instance, query_params):
+        self.gapi_instance = gapi_instance
+        self.base_query_params = query_params
+
+        # extract fields info
+        fields = self.base_query_params.get('fields')
+        self.result_class = GoogleDriveResult.for_fields(fields[fields.index('(') + 1:fields.rindex(')')])
+
+    async def pages(self):
+        """Handles pages generation
+
+        Returns:
+            (async generator) GoogleDriveResult lists, one per API page
+        """
+        token = None
+        while True:
+            query_params = dict(self.base_query_params)
+            if token:
+                query_params['pageToken'] = token
+
+            resp = await self.gapi_instance.request('GET', 'files', params=query_params)
+            yield [self.result_class(elem) for elem in resp.get('files', [])]
+
+            token = resp.get('nextPageToken')
+            if not token:
+                return
+
+    async def _iter_elements(self):
+        async for page in self.pages():
+            for elem in page:
+                yield elem
+
+    def __aiter__(self):
+        return self._iter_elements()
+
+    async def list(self):
+        """Handles consuming all pages
+
+        Returns:
+            (list) GoogleDriveResult instances
+        """
+        return [elem async for elem in self]
+
+
+class AsyncGoogleDriveAPI:
+    """Google Drive API asyncio client
+
+    Args:
+        service_account_file (str): path to GDrive credentials file
+        credentials (Credentials): google-auth credentials, alternative to service_account_file
+        connection_limit (int): max number of simultaneously open connections
+
+    Info:
+        requests are sent with aiohttp through single pooled session; methods mirror GoogleDriveAPI,
+        querysets keep selected mime type per instance, so they are safe for concurrent use;
+        requests go through process-wide rate limiter and quota and server errors are retried with backoff
+
+    Example:
+        async with AsyncGoogleDriveAPI(service_account_file='/path/to/config/file') as gapi:
+            await gapi.files.get(entry_id='123')
+            await gapi.folders.filter(name='test').list()
+            content = await gapi.folders.get_content('123').list()
+            results = await asyncio.gather(*[gapi.files.get(entry_id=file_id) for file_id in ids])
+    """
+
+    BASE_URL = 'https://www.googleapis.com/drive/v3/'
+    SCOPES = GoogleDriveAPI.SCOPES
+
+    def __init__(self, service_account_file=None, credentials=None, connection_limit=DEFAULT_CONNECTION_LIMIT,
+                 base_url=BASE_URL):
+        if not service_account_file and not credentials:
+            raise WrongInitGAPIException('You should specify either service_account_file or credentials')
+
+        if service_account_file:
+            credentials = service_account.Credentials.from_service_account_file(service_account_file,
+                                                                                scopes=self.SCOPES)
+
+        self.credentials = credentials
+        self.connection_limit = connection_limit
+        self.base_url = base_url
+        self.session = None
+        self._refresh_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connection_limit))
+            self._refresh_lock = asyncio.Lock()
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _auth_headers(self):
+        if not self.credentials.valid:
+            async with self._refresh_lock:
+                if not self.credentials.valid:
+                    # token refresh is blocking call, keep it away from event loop
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self.credentials.refresh, google_auth_httplib2.Request(httplib2.Http())
+                    )
+        return {'Authorization': 'Bearer {}'.format(self.credentials.token)}
+
+    async def request(self, method, path, params=None, json=None):
+        """Handles single API call
+
+        Args:
+            method (str): HTTP method, eg. 'GET'
+            path (str): path relative to base_url, eg. 'files'
+            params (dict): query params
+            json (dict): request body
+
+        Returns:
+            (dict) API response dict
+
+        Raises:
+            aiohttp.ClientResponseError when response status is not 2xx
+        """
+        async with self._send(method, path, params=params, json=json) as resp:
+            return await resp.json()
+
+    @staticmethod
+    def _method_id(method, path, params):
+        """Handles mapping HTTP request to API method ID, eg. ('GET', 'files') -> 'drive.files.list'"""
+        resource, _, entry_id = path.partition('/')
+        name = {'GET': 'get' if entry_id else 'list', 'POST': 'create', 'PATCH': 'update', 'DELETE': 'delete'}
+        method_id = 'drive.{}.{}'.format(resource, name.get(method, method.lower()))
+        return '{}_media'.format(method_id) if (params or {}).get('alt') == 'media' else method_id
+
+    @contextlib.asynccontextmanager
+    async def _send(self, method, path, params=None, json=None):
+        session = self._get_session()
+        limiter = get_rate_limiter()
+        method_id = self._method_id(method, path, params)
+        start = time.monotonic()
+
+        for retry_num in range(DEFAULT_MAX_RETRIES + 1):
+            await limiter.acquire_async()
+            headers = await self._auth_headers()
+
+            async with session.request(method, self.base_url + path, params=params, json=json, headers=headers) as resp:
+                if resp.status < 400:
+                    limiter.on_success()
+                    try:
+                        yield resp
+                    finally:
+                        record_call(method_id, time.monotonic() - start, resp.content_length or 0, retry_num)
+                    return
+
+                content = await resp.read()
+                if not is_retryable_error(resp.status, content) or retry_num == DEFAULT_MAX_RETRIES:
+                    record_call(method_id, time.monotonic() - start, len(content), retry_num, error=True)
+                    # error body is kept as message, so quota errors can be told apart (see is_retryable_error)
+                    raise aiohttp.ClientResponseError(
+                        resp.request_info, resp.history, status=resp.status,
+                        message=content.decode('utf-8', 'replace') or resp.reason, headers=resp.headers
+                    )
+
+                if is_quota_error(resp.status, content):
+                    limiter.on_quota_error()
+
+            await asyncio.sleep(backoff_delay(retry_num))
+
+    async def get_media(self, file_id, chunk_size=1024 * 1024):
+        """Handles file content download
+
+        Args:
+            file_id (str): GDrive entry ID
+            chunk_size (int): size of yielded chunks
+
+        Returns:
+            (async generator) file content chunks (bytes)
+        """
+        async with self._send('GET', 'files/' + file_id, params={'alt': 'media'}) as resp:
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                yield chunk
+
+    # ============================== gfile methods ==============================
+
+    async def get_gfile_meta_by_id(self, file_id, mime_type=None, selected_fields=''):
+        req_fields = selected_fields or DEFAULT_FIELDS
+
+        if not file_id:
+            raise ArgumentNotFoundGAPIException("You must pass 'file_id' parameter")
+
+        if mime_type and 'mimeType' not in req_fields:
+            raise ResponseFormatGAPIException(
+                "You should set 'mimeType' field in fields declaration when using 'folders' filter method"
+            )
+
+        try:
+            result = await self.request('GET', 'files/' + file_id, params={'fields': req_fields})
+        except aiohttp.ClientResponseError as err:
+            # quota and server errors left after retries are not the entry state
+            if is_retryable_error(err.status, err.message):
+                raise
+            raise EntryDoesNotExistGAPIException("Entry does net exist")
+
+        if mime_type and result.get('mimeType') != mime_type:
+            raise EntryDoesNotExistGAPIException(
+                "Mime type mismatch ('{}' != '{}')".format(mime_type, result.get('mimeType'))
+            )
+        return GoogleDriveResult(result, req_fields)
+
+    async def get_gfile_meta_by_name(self, name, mime_type=None, selected_fields=''):
+        req_fields = selected_fields or DEFAULT_FIELDS
+
+        if not name:
+            raise ArgumentNotFoundGAPIException("You must pass 'file_name' parameter")
+
+        query_dict = {'name': name}
+        if mime_type:
+            query_dict['mimeType'] = mime_type
+
+        result = await self.request('GET', 'files', params={
+            'q': GoogleDriveAPI._query_from_dict(query_dict), 'fields': 'files({})'.format(req_fields)
+        })
+        files_result = result.get('files')
+
+        if files_result:
+            if len(files_result) > 1:
+                raise MultipleObjectsReturnedGAPIException("Multiple object returned: {}".format(files_result))
+
+            return GoogleDriveResult(files_result[0], req_fields)
+
+        raise EntryDoesNotExistGAPIException("Empty result set")
+
+    def get_gfiles_meta(self, query_dict=None, selected_fields=''):
+        req_fields = selected_fields or DEFAULT_FIELDS
+
+        params = {
+            'fields': 'files({}), nextPageToken'.format(req_fields)
+        }
+
+        if query_dict:
+            params['q'] = GoogleDriveAPI._query_from_dict(query_dict)
+
+        return AsyncGoogleDriveListIterator(self, params)
+
+    def get_gfiles_children_by_id(self, entry_id, mime_type=None, exclude_mime_type=None, selected_fields=''):
+        req_fields = selected_fields or DEFAULT_FIELDS
+
+        if not entry_id:
+            raise ArgumentNotFoundGAPIException("You must pass 'entry_id' parameter")
+
+        query = "'{}' in parents".format(entry_id)
+
+        if mime_type:
+            query = "{} and mimeType='{}'".format(query, mime_type)
+
+        if exclude_mime_type:
+            query = "{} and mimeType!='{}'".format(query, exclude_mime_type)
+
+        return AsyncGoogleDriveListIterator(self, {
+            'q': query,
+            'fields': 'files({}), nextPageToken'.format(req_fields)
+        })
+
+    # ============================== api querysets ==============================
+
+    @property
+    def files(self):
+        return AsyncGoogleDriveEntry(self)
+
+    @property
+    def folders(self):
+        return AsyncGoogleDriveFolder(self, mime_type=MimeType.GOOGLE_FOLDER_MIME_TYPE)
+
+
+class AsyncGoogleDriveEntry:
+    """Google Drive Entry async queryset
+
+    Args:
+        gapi_instance (AsyncGoogleDriveAPI): api instance
+        mime_type (str): MIME type of listed entries, None for all
+    """
+
+    def __init__(self, gapi_instance, mime_type=None):
+        self.gapi_instance = gapi_instance
+        self.mime_type = mime_type
+
+    @staticmethod
+    def _selected_fields(fields, more_fields):
+        fields = fields or DEFAULT_FIELDS
+        return '{}, {}'.format(fields, more_fields) if more_fields else fields
+
+    async def get(self, entry_id=None, name=None, fields='', more_fields=''):
+        selected_fields = self._selected_fields(fields, more_fields)
+
+        if entry_id:
+            return await self.gapi_instance.get_gfile_meta_by_id(
+                entry_id, mime_type=self.mime_type, selected_fields=selected_fields
+            )
+        if name:
+            return await self.gapi_instance.get_gfile_meta_by_name(
+                name, mime_type=self.mime_type, selected_fields=selected_fields
+            )
+        raise ArgumentNotFoundGAPIException("You must pass 'entry_id' or 'name' parameter")
+
+    def filter(self, name, fields='', more_fields=''):
+        query_dict = {'name': name}
+        if self.mime_type:
+            query_dict['mimeType'] = self.mime_type
+
+        return self.gapi_instance.get_gfiles_meta(
+            query_dict, selected_fields=self._selected_fields(fields, more_fields)
+        )
+
+    def all(self, fields='', more_fields=''):
+        query_dict = {'mimeType': self.mime_type} if self.mime_type else None
+        return self.gapi_instance.get_gfiles_meta(
+            query_dict, selected_fields=self._selected_fields(fields, more_fields)
+        )
+
+    async def exists(self, entry_id=None, name=None):
+        try:
+            result = await self.get(entry_id=entry_id, name=name)
+            return bool(result and result.id is not None)
+        except MultipleObjectsReturnedGAPIException:
+            return True
+        except Exception:
+            return False
+
+
+class AsyncGoogleDriveFolder(AsyncGoogleDriveEntry):
+    """Google Drive Folder async queryset
+    """
+
+    def get_files(self, entry_id, fields='', more_fields=''):
+        return self.gapi_instance.get_gfiles_children_by_id(
+            entry_id, exclude_mime_type=MimeType.GOOGLE_FOLDER_MIME_TYPE,
+            selected_fields=self._selected_fields(fields, more_fields)
+        )
+
+    def get_content(self, entry_id, fields='', more_fields=''):
+        return self.gapi_instance.get_gfiles_children_by_id(
+            entry_id, selected_fields=self._selected_fields(fields, more_fields)
+        )
+
+    def get_subfolders(self, entry_id, fields='', more_fields=''):
+        return self.gapi_instance.get_gfiles_children_by_id(
+            entry_id, mime_type=MimeType.GOOGLE_FOLDER_MIME_TYPE,
+            selected_fields=self._selected_fields(fields, more_fields)
+        )
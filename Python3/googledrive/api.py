@@ -1,7 +1,8 @@
 import logging
+import threading
+import time
 
 try:
-    from apiclient.discovery import build
     from apiclient.errors import HttpError
     from google.oauth2 import service_account
 except ImportError:
@@ -12,11 +13,15 @@ try:
 except ImportError:
     logging.error('You should install oauth2client lib: pip install oauth2client==4.1.2')
 
-from constants import DEFAULT_FIELDS, MimeType
+from constants import BATCH_MAX_SIZE, DEFAULT_FIELDS, DEFAULT_MAX_RETRIES, MAX_QUERY_LENGTH, MimeType
+from dedup import GoogleDriveMD5Index
 from exceptions import EntryDoesNotExistGAPIException, MultipleObjectsReturnedGAPIException, \
     ArgumentNotFoundGAPIException, ResponseFormatGAPIException, WrongInitGAPIException
 from queryset import GoogleDriveFolder, GoogleDriveFile
-from result_helpers import GoogleDriveListIterator, GoogleDriveResult
+from rate_limit import backoff_delay, call_with_backoff, execute_request, get_rate_limiter, is_quota_error, \
+    is_retryable_error
+from result_helpers import GoogleDriveChildrenIterator, GoogleDriveListIterator, GoogleDriveResult, parse_fields
+from service_pool import authorized_http, default_service_pool
 
 logging.basicConfig(level=logging.WARNING)
 
@@ -26,23 +31,36 @@ class GoogleDriveAPI:
 
     Args:
         service_account_file (str): path to GDrive credentials file
+        list_prefetch (int): number of list pages read ahead in a background thread; 0 disables read-ahead
+        metadata_cache (GoogleDriveMetadataCache): optional cache for get by ID calls
+        service_pool (GoogleDriveServicePool): pool building services, default: process-wide pool
 
     Attributes:
-        drive_handler (Resource): GDrive connection handler
+        credentials (Credentials): GDrive credentials
+        drive_handler (Resource): GDrive connection handler of the current thread
+        service_factory (callable): returns GDrive connection handler of the current thread,
+            eg. GoogleDriveServices freed together with this instance
         current_mime_type (MimeType): selected mime type
+        list_prefetch (int): read-ahead depth passed to list iterators
+        metadata_cache (GoogleDriveMetadataCache): entries metadata cache or None
+        md5_index (GoogleDriveMD5Index): folders content hashes index used by deduplicated uploads
 
     Example:
         gapi = GoogleDriveAPI(service_account_file='/path/to/config/file')
         gapi = GoogleDriveAPI(storage='/path/to/store')
+        gapi = GoogleDriveAPI(service_account_file='/path/to/config/file', list_prefetch=2)
+        gapi = GoogleDriveAPI(service_account_file='/path/to/config/file', metadata_cache=GoogleDriveMetadataCache())
         gapi.get(id='123')
         gapi.get(name='test')
         gapi.folders.filter(name='test')
         gapi.folders.all()
+        gapi.get_many(['123', '456'])
     """
 
     SCOPES = ['https://www.googleapis.com/auth/drive']
 
-    def __init__(self, service_account_file=None, storage=None):
+    def __init__(self, service_account_file=None, storage=None, list_prefetch=0, metadata_cache=None,
+                 service_pool=None):
         if not service_account_file and not storage:
             raise WrongInitGAPIException('You should specify either service_account_file or storage file path')
 
@@ -57,15 +75,58 @@ class GoogleDriveAPI:
         if not credentials:
             raise WrongInitGAPIException('Unexpected credentials creation error')
 
-        # cache_discovery=False due to googleapiclient cache import error
+        # services are built from discovery document parsed once per process, see service_pool.py;
+        # googleapiclient discovery cache is not used due to import error
         # https://github.com/google/google-api-python-client/issues/299
-        self.drive_handler = build('drive', 'v3', credentials=credentials, cache_discovery=False)
+        self.service_factory = (service_pool or default_service_pool).services(credentials)
+        self.credentials = credentials
         self.current_mime_type = None
+        self.list_prefetch = list_prefetch
+        self.metadata_cache = metadata_cache
+        self.md5_index = GoogleDriveMD5Index(self)
+        self._thread_local = threading.local()
 
     @staticmethod
     def _query_from_dict(input_dict):
         return " and ".join(['{}=\'{}\''.format(key, value) for key, value in input_dict.items()])
 
+    @property
+    def drive_handler(self):
+        """GDrive connection handler of the current thread
+
+        Returns:
+            (Resource) Drive service, safe to use from many threads as every thread gets its own instance
+        """
+        return self.service_factory()
+
+    @drive_handler.setter
+    def drive_handler(self, drive_handler):
+        # pinned handler is shared by all threads
+        self.service_factory = lambda: drive_handler
+
+    def new_http(self):
+        """New authorized HTTP handle
+
+        Info:
+            httplib2 handles are not thread-safe, so every thread should use its own handle
+
+        Returns:
+            (httplib2.Http) authorized HTTP handle
+        """
+        return authorized_http(self.credentials)
+
+    @property
+    def thread_http(self):
+        """Authorized HTTP handle of the current thread
+
+        Returns:
+            (httplib2.Http) authorized HTTP handle, created on first use in each thread
+        """
+        http = getattr(self._thread_local, 'http', None)
+        if http is None:
+            http = self._thread_local.http = self.new_http()
+        return http
+
     def file_media_handler(self, file_id):
         """File media handler
 
@@ -74,6 +135,29 @@ class GoogleDriveAPI:
         """
         return self.drive_handler.files().get_media(fileId=file_id)
 
+    # ============================== metadata cache methods ==============================
+
+    def _get_cached_meta(self, file_id, selected_fields):
+        if self.metadata_cache is None:
+            return None
+
+        self.metadata_cache.maybe_refresh(self.drive_handler)
+        return self.metadata_cache.get(file_id, parse_fields(selected_fields))
+
+    def _set_cached_meta(self, file_id, selected_fields, result):
+        if self.metadata_cache is not None:
+            self.metadata_cache.set(file_id, parse_fields(selected_fields), result)
+
+    def refresh_metadata_cache(self):
+        """Invalidate cached entries changed since the last check
+
+        Returns:
+            (int) number of invalidated entries
+        """
+        if self.metadata_cache is None:
+            return 0
+        return self.metadata_cache.refresh(self.drive_handler)
+
     # ============================== gfile methods ==============================
 
     def get_gfile_meta_by_id(self, file_id, mime_type=None, selected_fields=''):
@@ -101,13 +185,20 @@ class GoogleDriveAPI:
             )
 
         try:
-            result = self.drive_handler.files().get(fileId=file_id, fields=req_fields).execute()
+            result = self._get_cached_meta(file_id, req_fields)
+            if result is None:
+                result = execute_request(self.drive_handler.files().get(fileId=file_id, fields=req_fields))
+                self._set_cached_meta(file_id, req_fields, result)
+
             if mime_type and result.get('mimeType') != mime_type:
                 raise EntryDoesNotExistGAPIException(
                     "Mime type mismatch ('{}' != '{}')".format(mime_type, result.get('mimeType'))
                 )
             return GoogleDriveResult(result, req_fields)
-        except HttpError:
+        except HttpError as err:
+            # quota and server errors left after retries are not the entry state
+            if is_retryable_error(err.resp.status, err.content):
+                raise
             raise EntryDoesNotExistGAPIException("Entry does net exist")
 
     def get_gfile_meta_by_name(self, name, mime_type=None, selected_fields=''):
@@ -135,9 +226,9 @@ class GoogleDriveAPI:
             query_dict['mimeType'] = mime_type
 
         # api call
-        result = self.drive_handler.files().list(
+        result = execute_request(self.drive_handler.files().list(
             q=self._query_from_dict(query_dict), fields='files({})'.format(req_fields)
-        ).execute()
+        ))
         files_result = result.get('files')
 
         if files_result:
@@ -177,7 +268,7 @@ class GoogleDriveAPI:
         }
 
         # api call with result gather
-        return GoogleDriveListIterator(self.drive_handler, params)
+        return GoogleDriveListIterator(self.service_factory, params, prefetch=self.list_prefetch)
 
     def get_gfiles_meta(self, mime_type=None, selected_fields=''):
         """
@@ -201,22 +292,95 @@ class GoogleDriveAPI:
         if mime_type:
             params['q'] = self._query_from_dict({'mimeType': mime_type})
 
-        return GoogleDriveListIterator(self.drive_handler, params)
+        return GoogleDriveListIterator(self.service_factory, params, prefetch=self.list_prefetch)
+
+    def get_gfiles_meta_by_query(self, query=None, order_by=None, selected_fields='', element_filter=None):
+        """
+        Args:
+            query (str): Drive search query, eg. "name contains 'test' and trashed = false"
+            order_by (str): comma separated sort keys, eg. 'modifiedTime desc,name'
+            selected_fields (str): comma separated field names, which should be download with Google API response
+            element_filter (callable): client-side filter of API response dicts
+
+        Returns:
+             API response (GoogleDriveListIterator)
+
+        Example:
+            gapi_instance.get_gfiles_meta_by_query("name contains 'test'", order_by='modifiedTime desc')
+        """
+        req_fields = selected_fields or DEFAULT_FIELDS
+
+        params = {
+            'fields': 'files({}), nextPageToken'.format(req_fields)
+        }
+
+        if query:
+            params['q'] = query
+
+        if order_by:
+            params['orderBy'] = order_by
 
-    def get_gfiles_children_by_id(self, entry_id, mime_type=None, exclude_mime_type=None, selected_fields=''):
+        return GoogleDriveListIterator(
+            self.service_factory, params, prefetch=self.list_prefetch, element_filter=element_filter
+        )
+
+    @staticmethod
+    def _parents_queries(entry_ids, query_suffix=''):
+        """Handles packing parents conditions into OR queries
+
+        Args:
+            entry_ids (list): IDs of Google Drive folders
+            query_suffix (str): additional query conditions, eg. " and mimeType='...'"
+
+        Returns:
+            (list) (query, IDs tuple) pairs, every query not longer than MAX_QUERY_LENGTH when possible
+        """
+        queries = []
+        current_ids = []
+        current_length = len(query_suffix) + 2  # brackets
+
+        for entry_id in entry_ids:
+            condition_length = len("'{}' in parents".format(entry_id)) + len(' or ')
+
+            if current_ids and current_length + condition_length > MAX_QUERY_LENGTH:
+                queries.append(current_ids)
+                current_ids = []
+                current_length = len(query_suffix) + 2
+
+            current_ids.append(entry_id)
+            current_length += condition_length
+
+        if current_ids:
+            queries.append(current_ids)
+
+        return [
+            ('({}){}'.format(' or '.join("'{}' in parents".format(entry_id) for entry_id in ids), query_suffix),
+             tuple(ids))
+            for ids in queries
+        ]
+
+    def get_gfiles_children_by_id(self, entry_id, mime_type=None, exclude_mime_type=None, selected_fields='',
+                                  http=None):
         """
         Args:
-            entry_id (str): ID of Google Drive entry/file/folder
+            entry_id (str or list): ID of Google Drive entry/file/folder or list of such IDs
             mime_type (str): MIME type of Google Drive entry/file/folder, eg. 'application/octet-stream'
             exclude_mime_type (str): MIME type to exclude, eg. 'application/octet-stream'
             selected_fields (str): comma separated field names, which should be download with Google API response
+            http (httplib2.Http): HTTP handle used for list calls, eg. GoogleDriveAPI.thread_http in worker threads
 
         Returns:
-             API response (GoogleDriveListIterator)
+             API response (GoogleDriveListIterator) for single ID
+             or (GoogleDriveChildrenIterator) of (parent ID, result) pairs for list of IDs
+
+        Info:
+            children of many parents are listed with OR queries, packed up to MAX_QUERY_LENGTH characters;
+            'parents' field is added to selected fields to map results back to parents
 
         Example:
             gapi_instance._get_gfiles_children_by_id('someId', mime_type=MimeType.GOOGLE_FOLDER_MIME_TYPE)
             gapi_instance._get_gfiles_children_by_id('someId', exclude_mime_type=MimeType.GOOGLE_FOLDER_MIME_TYPE)
+            gapi_instance._get_gfiles_children_by_id(['someId', 'otherId']).group()
         """
 
         req_fields = selected_fields or DEFAULT_FIELDS
@@ -224,20 +388,36 @@ class GoogleDriveAPI:
         if not entry_id:
             raise ArgumentNotFoundGAPIException("You must pass 'entry_id' parameter")
 
-        query = "'{}' in parents".format(entry_id)
+        query_suffix = ''
 
         if mime_type:
-            query = "{} and mimeType='{}'".format(query, mime_type)
+            query_suffix = "{} and mimeType='{}'".format(query_suffix, mime_type)
 
         if exclude_mime_type:
-            query = "{} and mimeType!='{}'".format(query, exclude_mime_type)
+            query_suffix = "{} and mimeType!='{}'".format(query_suffix, exclude_mime_type)
 
-        params = {
-            'q': query,
-            'fields': 'files({}), nextPageToken'.format(req_fields)
-        }
+        if isinstance(entry_id, str):
+            params = {
+                'q': "'{}' in parents{}".format(entry_id, query_suffix),
+                'fields': 'files({}), nextPageToken'.format(req_fields)
+            }
+
+            return GoogleDriveListIterator(self.service_factory, params, prefetch=self.list_prefetch, http=http)
+
+        if 'parents' not in parse_fields(req_fields):
+            req_fields = '{}, parents'.format(req_fields)
+
+        iterators = []
+        for query, entry_ids in self._parents_queries(entry_id, query_suffix):
+            params = {
+                'q': query,
+                'fields': 'files({}), nextPageToken'.format(req_fields)
+            }
+            iterators.append((
+                entry_ids, GoogleDriveListIterator(self.service_factory, params, prefetch=self.list_prefetch, http=http)
+            ))
 
-        return GoogleDriveListIterator(self.drive_handler, params)
+        return GoogleDriveChildrenIterator(iterators)
 
     def create_gfile(self, name, mime_type=None, parents=None):
         """
@@ -263,7 +443,131 @@ class GoogleDriveAPI:
         if parents:
             file_metadata['parents'] = parents
 
-        return self.drive_handler.files().create(body=file_metadata, fields='id').execute().get('id')
+        return execute_request(self.drive_handler.files().create(body=file_metadata, fields='id')).get('id')
+
+    def create_shortcut(self, name, target_id, parents=None):
+        """
+
+        Args:
+            name (str): shortcut name
+            target_id (str): ID of Google Drive entry pointed by shortcut
+            parents (list): list of folder IDs
+
+        Returns:
+             (str) created shortcut ID
+
+        Example:
+            gapi_instance.create_shortcut('testName', 'targetId', parents=('testId',))
+        """
+        file_metadata = {
+            'name': name,
+            'mimeType': MimeType.GOOGLE_SHORTCUT_MIME_TYPE,
+            'shortcutDetails': {'targetId': target_id}
+        }
+
+        if parents:
+            file_metadata['parents'] = list(parents)
+
+        return execute_request(self.drive_handler.files().create(body=file_metadata, fields='id')).get('id')
+
+    # ============================== batch methods ==============================
+
+    def get_many(self, ids, fields='', mime_type=None):
+        """Google API batch call handler - get data by many IDs
+
+        Args:
+            ids (list): IDs of Google Drive entries/files/folders
+            fields (str): comma separated field names, which should be download with Google API response
+            mime_type (str): MIME type of Google Drive entry/file/folder, eg. 'application/octet-stream'
+
+        Returns:
+             (list) GoogleDriveResult or EntryDoesNotExistGAPIException instance for every ID, in input order
+
+        Info:
+            requests are grouped in batch API calls, up to BATCH_MAX_SIZE requests each;
+            requests failed with quota or server errors are sent again in next batches with backoff;
+            errors are not raised but returned as EntryDoesNotExistGAPIException markers
+
+        Example:
+            results = gapi_instance.get_many(['someTestId', 'otherTestId'])
+            found = [elem for elem in results if not isinstance(elem, EntryDoesNotExistGAPIException)]
+        """
+        req_fields = fields or DEFAULT_FIELDS
+
+        if mime_type and 'mimeType' not in req_fields:
+            raise ResponseFormatGAPIException(
+                "You should set 'mimeType' field in fields declaration when using 'folders' filter method"
+            )
+
+        ids = list(ids)
+        results = [None] * len(ids)
+        result_class = GoogleDriveResult.for_fields(req_fields)
+
+        def set_result(index, response):
+            if mime_type and response.get('mimeType') != mime_type:
+                results[index] = EntryDoesNotExistGAPIException(
+                    "Mime type mismatch ('{}' != '{}')".format(mime_type, response.get('mimeType'))
+                )
+            else:
+                results[index] = result_class(response)
+
+        retry_indexes = []
+        # quota errors of single batch, limiter backs off once per batch
+        quota_errors = []
+        limiter = get_rate_limiter()
+
+        def handle_response(request_id, response, exception):
+            index = int(request_id)
+
+            if exception is not None:
+                if isinstance(exception, HttpError) and is_retryable_error(exception.resp.status, exception.content):
+                    retry_indexes.append(index)
+                    if is_quota_error(exception.resp.status, exception.content):
+                        quota_errors.append(index)
+
+                results[index] = EntryDoesNotExistGAPIException("Entry does net exist: {}".format(ids[index]))
+            else:
+                self._set_cached_meta(ids[index], req_fields, response)
+                set_result(index, response)
+
+        pending_indexes = []
+        for index, file_id in enumerate(ids):
+            if not file_id:
+                results[index] = EntryDoesNotExistGAPIException("Empty entry ID")
+                continue
+
+            cached = self._get_cached_meta(file_id, req_fields)
+            if cached is not None:
+                set_result(index, cached)
+                continue
+
+            pending_indexes.append(index)
+
+        for retry_num in range(DEFAULT_MAX_RETRIES + 1):
+            if retry_num:
+                time.sleep(backoff_delay(retry_num - 1))
+
+            for offset in range(0, len(pending_indexes), BATCH_MAX_SIZE):
+                batch = self.drive_handler.new_batch_http_request(callback=handle_response)
+                chunk = pending_indexes[offset:offset + BATCH_MAX_SIZE]
+
+                for index in chunk:
+                    batch.add(
+                        self.drive_handler.files().get(fileId=ids[index], fields=req_fields), request_id=str(index)
+                    )
+
+                call_with_backoff(batch.execute, tokens=len(chunk), method='drive.files.get.batch')
+
+                if quota_errors:
+                    limiter.on_quota_error()
+                    quota_errors[:] = []
+
+            if not retry_indexes:
+                break
+
+            pending_indexes, retry_indexes[:] = sorted(retry_indexes), []
+
+        return results
 
     # ============================== api file methods ==============================
 
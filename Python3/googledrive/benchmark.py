@@ -0,0 +1,476 @@
+"""Benchmarks of list, download and upload hot paths against local fake Drive v3 server
+
+Usage:
+    python benchmark.py
+    python benchmark.py --latency 0.02 --objects 20000 --page-size 1000 --file-size 64 --quota-error-rate 0.01
+    python benchmark.py --benchmarks download upload_resumable --files 3 --file-size 256
+
+Info:
+    fake server runs in this process, every benchmark runs in separate subprocess, so peak RSS is measured per
+    benchmark; Drive client is built from minimal discovery document served by the fake server;
+    quota errors are answered with 403 rateLimitExceeded, so reported numbers include real backoff sleeps
+"""
+import argparse
+import json
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+MB = 1024 * 1024
+
+BENCHMARKS = ('list', 'download', 'upload', 'upload_resumable')
+
+
+def discovery_document(root_url):
+    """Minimal Drive v3 discovery document with files.list, files.get and files.create methods
+
+    Args:
+        root_url (str): fake server URL, eg. 'http://127.0.0.1:8080/'
+
+    Returns:
+        (dict) discovery document for googleapiclient.discovery.build_from_document()
+    """
+
+    file_id_param = {'type': 'string', 'location': 'path', 'required': True}
+    return {
+        'kind': 'discovery#restDescription',
+        'discoveryVersion': 'v1',
+        'id': 'drive:v3',
+        'name': 'drive',
+        'version': 'v3',
+        'protocol': 'rest',
+        'rootUrl': root_url,
+        'servicePath': 'drive/v3/',
+        'batchPath': 'batch/drive/v3',
+        'parameters': {
+            'alt': {'type': 'string', 'location': 'query', 'default': 'json'},
+            'fields': {'type': 'string', 'location': 'query'},
+        },
+        'schemas': {
+            'File': {'id': 'File', 'type': 'object'},
+            'FileList': {'id': 'FileList', 'type': 'object'},
+        },
+        'resources': {
+            'files': {
+                'methods': {
+                    'list': {
+                        'id': 'drive.files.list',
+                        'path': 'files',
+                        'httpMethod': 'GET',
+                        'parameters': {
+                            'q': {'type': 'string', 'location': 'query'},
+                            'orderBy': {'type': 'string', 'location': 'query'},
+                            'pageSize': {'type': 'integer', 'location': 'query'},
+                            'pageToken': {'type': 'string', 'location': 'query'},
+                        },
+                        'response': {'$ref': 'FileList'},
+                    },
+                    'get': {
+                        'id': 'drive.files.get',
+                        'path': 'files/{fileId}',
+                        'httpMethod': 'GET',
+                        'parameters': {'fileId': file_id_param},
+                        'parameterOrder': ['fileId'],
+                        'response': {'$ref': 'File'},
+                        'supportsMediaDownload': True,
+                    },
+                    'create': {
+                        'id': 'drive.files.create',
+                        'path': 'files',
+                        'httpMethod': 'POST',
+                        'request': {'$ref': 'File'},
+                        'response': {'$ref': 'File'},
+                        'supportsMediaUpload': True,
+                        'mediaUpload': {
+                            'accept': ['*/*'],
+                            'maxSize': '5120GB',
+                            'protocols': {
+                                'simple': {'multipart': True, 'path': '/upload/drive/v3/files'},
+                                'resumable': {'multipart': True, 'path': '/resumable/upload/drive/v3/files'},
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    }
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    """Fake Drive v3 API request handler
+
+    Info:
+        files are generated on the fly: 'file-<number>' IDs, every file has server.file_size bytes;
+        media downloads support Range requests, uploads support multipart and resumable protocols
+    """
+
+    protocol_version = 'HTTP/1.1'
+    block = bytes(range(256)) * 4096  # 1 MB of media content pattern
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.count(bytes_in=len(body))
+        return body
+
+    def _send(self, status, body=b'', headers=None):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode('utf-8')
+            headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(bytes_out=len(body))
+
+    def _quota_error(self):
+        if random.random() >= self.server.quota_error_rate:
+            return False
+
+        self.server.count(quota_errors=1)
+        self._send(403, {'error': {
+            'code': 403, 'message': 'Rate Limit Exceeded',
+            'errors': [{'domain': 'usageLimits', 'reason': 'rateLimitExceeded', 'message': 'Rate Limit Exceeded'}]
+        }})
+        return True
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self._read_body()
+
+        if url.path == '/discovery':
+            return self._send(200, discovery_document(self.server.url))
+
+        self.server.count(requests=1)
+        time.sleep(self.server.latency)
+        if self._quota_error():
+            return
+
+        if method == 'GET' and url.path == '/drive/v3/files':
+            return self._list(params)
+
+        match = re.match(r'^/drive/v3/files/([^/]+)$', url.path)
+        if method == 'GET' and match:
+            if params.get('alt') == 'media':
+                return self._media(match.group(1))
+            return self._send(200, self.server.file_meta(match.group(1)))
+
+        if url.path == '/upload/drive/v3/files':
+            if method == 'POST' and params.get('uploadType') == 'resumable':
+                return self._upload_start()
+            if method == 'POST':
+                return self._send(200, {'id': self.server.new_file_id()})
+            if method == 'PUT':
+                return self._upload_chunk(params.get('upload_id'), body)
+
+        self._send(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+    def _list(self, params):
+        start = int(params.get('pageToken', 0))
+        size = min(int(params.get('pageSize', self.server.page_size)), self.server.page_size)
+        end = min(start + size, self.server.objects)
+
+        resp = {'files': [self.server.file_meta('file-{}'.format(number)) for number in range(start, end)]}
+        if end < self.server.objects:
+            resp['nextPageToken'] = str(end)
+        self._send(200, resp)
+
+    def _media(self, file_id):
+        start, end = 0, self.server.file_size - 1
+        status = 200
+        headers = {'Content-Type': 'application/octet-stream'}
+
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            status = 206
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, self.server.file_size)
+
+        size = max(0, end - start + 1)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+        offset = start % len(self.block)
+        while size:
+            chunk = self.block[offset:offset + size]
+            self.wfile.write(chunk)
+            size -= len(chunk)
+            offset = 0
+        self.server.count(bytes_out=end - start + 1)
+
+    def _upload_start(self):
+        upload_id = self.server.new_upload()
+        location = '{}upload/drive/v3/files?uploadType=resumable&upload_id={}'.format(self.server.url, upload_id)
+        self._send(200, headers={'Location': location})
+
+    def _upload_chunk(self, upload_id, body):
+        match = re.match(r'bytes (\d+)-(\d+)/(\d+)|bytes \*/(\d+)', self.headers.get('Content-Range') or '')
+        if upload_id not in self.server.uploads or not match:
+            return self._send(404, {'error': {'code': 404, 'message': 'Upload session not found'}})
+
+        if match.group(1) is not None:
+            self.server.uploads[upload_id] = int(match.group(2)) + 1
+            total = int(match.group(3))
+        else:
+            total = int(match.group(4))
+
+        received = self.server.uploads[upload_id]
+        if received >= total:
+            return self._send(200, {'id': self.server.new_file_id()})
+        self._send(308, headers={'Range': 'bytes=0-{}'.format(received - 1)} if received else None)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+
+class FakeDriveServer(ThreadingHTTPServer):
+    """Local HTTP stand-in for Drive v3 API
+
+    Args:
+        latency (float): seconds added to every API response
+        page_size (int): max files list page size
+        objects (int): number of listed files
+        file_size (int): size of every file in bytes
+        quota_error_rate (float): fraction of API requests answered with 403 rateLimitExceeded
+
+    Example:
+        with FakeDriveServer(latency=0.01) as server:
+            server.start()
+            drive_handler = build_from_document(server.discovery(), http=build_http())
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, page_size=1000, objects=10000, file_size=MB, quota_error_rate=0.0):
+        super().__init__(('127.0.0.1', 0), FakeDriveHandler)
+        self.latency = latency
+        self.page_size = page_size
+        self.objects = objects
+        self.file_size = file_size
+        self.quota_error_rate = quota_error_rate
+
+        self.url = 'http://127.0.0.1:{}/'.format(self.server_address[1])
+        self.uploads = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.reset_stats()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def discovery(self):
+        return discovery_document(self.url)
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'quota_errors': 0}
+
+    def count(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                self.stats[name] += value
+
+    def new_file_id(self):
+        with self._lock:
+            self._next_id += 1
+            return 'uploaded-{}'.format(self._next_id)
+
+    def new_upload(self):
+        upload_id = self.new_file_id()
+        self.uploads[upload_id] = 0
+        return upload_id
+
+    def file_meta(self, file_id):
+        return {
+            'kind': 'drive#file', 'id': file_id, 'name': '{}.bin'.format(file_id),
+            'mimeType': 'application/octet-stream', 'size': str(self.file_size), 'parents': ['root']
+        }
+
+
+# ============================== benchmarks (run in subprocess) ==============================
+
+class _NullSink:
+    """Download target dropping received data"""
+
+    def write(self, data):
+        return len(data)
+
+
+def bench_list(drive_handler, options):
+    from result_helpers import GoogleDriveListIterator
+
+    params = {'fields': 'files(id, name, mimeType, size, parents), nextPageToken', 'pageSize': options.page_size}
+    return sum(1 for _ in GoogleDriveListIterator(drive_handler, params, prefetch=options.prefetch).iterator())
+
+
+def bench_download(drive_handler, options):
+    from result_helpers import GoogleDriveFileDownloader
+
+    for number in range(options.files):
+        request = drive_handler.files().get_media(fileId='file-{}'.format(number))
+        GoogleDriveFileDownloader(request, file_handler=_NullSink(), chunk_size=options.chunk_size * MB).download()
+    return options.files
+
+
+def _bench_upload(drive_handler, options, resumable):
+    from result_helpers import GoogleDriveFileUploader
+
+    with tempfile.NamedTemporaryFile(suffix='.bin') as source:
+        block = FakeDriveHandler.block
+        for _ in range(options.file_size * MB // len(block)):
+            source.write(block)
+        source.write(block[:options.file_size * MB % len(block)])
+        source.flush()
+
+        for number in range(options.files):
+            uploader = GoogleDriveFileUploader(
+                'upload-{}.bin'.format(number), source.name, resumable=resumable, chunk_size=options.chunk_size * MB,
+                session_file=source.name + '.gdupload'
+            )
+            uploader.upload(drive_handler)
+    return options.files
+
+
+def bench_upload(drive_handler, options):
+    return _bench_upload(drive_handler, options, resumable=False)
+
+
+def bench_upload_resumable(drive_handler, options):
+    return _bench_upload(drive_handler, options, resumable=True)
+
+
+def peak_rss():
+    """Peak resident set size of the current process in bytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_child(options):
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.http import build_http
+
+    from rate_limit import configure_rate_limiter
+
+    configure_rate_limiter(rate=options.rate_limit, max_rate=options.rate_limit)
+
+    http = build_http()
+    # resumable upload progress is reported with 308 without Location, which httplib2 >= 0.16 treats as redirect
+    http.redirect_codes = http.redirect_codes - {308}
+    _, content = http.request(options.url + 'discovery')
+    drive_handler = build_from_document(json.loads(content.decode('utf-8')), http=http)
+
+    start = time.monotonic()
+    objects = globals()['bench_{}'.format(options.child)](drive_handler, options)
+    elapsed = time.monotonic() - start
+
+    print(json.dumps({'objects': objects, 'elapsed': elapsed, 'peak_rss': peak_rss()}))
+
+
+# ============================== harness ==============================
+
+def run_benchmark(name, server, options):
+    """Handles running single benchmark in subprocess
+
+    Returns:
+        (dict) benchmark results
+    """
+
+    args = [
+        sys.executable, __file__, '--child', name, '--url', server.url,
+        '--page-size', str(options.page_size), '--prefetch', str(options.prefetch), '--files', str(options.files),
+        '--file-size', str(options.file_size), '--chunk-size', str(options.chunk_size),
+        '--rate-limit', str(options.rate_limit)
+    ]
+
+    server.reset_stats()
+    output = subprocess.check_output(args)
+    result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    elapsed = result['elapsed'] or 1e-9
+    payload = server.stats['bytes_in'] + server.stats['bytes_out']
+    return {
+        'benchmark': name,
+        'elapsed': result['elapsed'],
+        'requests': server.stats['requests'],
+        'quota_errors': server.stats['quota_errors'],
+        'requests_per_s': server.stats['requests'] / elapsed,
+        'objects_per_s': result['objects'] / elapsed,
+        'mb_per_s': payload / MB / elapsed,
+        'peak_rss_mb': result['peak_rss'] / MB,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='googledrive package benchmarks against local fake Drive server')
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every API response')
+    parser.add_argument('--page-size', type=int, default=1000, help='max files list page size')
+    parser.add_argument('--objects', type=int, default=10000, help='number of listed files')
+    parser.add_argument('--files', type=int, default=5, help='number of downloaded/uploaded files')
+    parser.add_argument('--file-size', type=int, default=32, help='file size in MB')
+    parser.add_argument('--chunk-size', type=int, default=8, help='download/upload chunk size in MB')
+    parser.add_argument('--quota-error-rate', type=float, default=0.0, help='fraction of 403 rateLimitExceeded')
+    parser.add_argument('--prefetch', type=int, default=0, help='list pages read ahead')
+    parser.add_argument('--rate-limit', type=float, default=10000, help='client rate limit, requests per second')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    parser.add_argument('--child', choices=BENCHMARKS, help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+
+    if options.child:
+        return run_child(options)
+
+    server = FakeDriveServer(
+        latency=options.latency, page_size=options.page_size, objects=options.objects,
+        file_size=options.file_size * MB, quota_error_rate=options.quota_error_rate
+    ).start()
+
+    try:
+        if not options.json:
+            print('{:<18}{:>10}{:>10}{:>8}{:>14}{:>14}{:>10}{:>14}'.format(
+                'benchmark', 'time [s]', 'requests', '403', 'requests/s', 'objects/s', 'MB/s', 'peak RSS [MB]'
+            ))
+
+        for name in options.benchmarks:
+            result = run_benchmark(name, server, options)
+
+            if options.json:
+                print(json.dumps(result))
+            else:
+                print('{benchmark:<18}{elapsed:>10.2f}{requests:>10}{quota_errors:>8}{requests_per_s:>14.1f}'
+                      '{objects_per_s:>14.1f}{mb_per_s:>10.1f}{peak_rss_mb:>14.1f}'.format(**result))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
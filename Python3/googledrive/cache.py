@@ -0,0 +1,193 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from constants import DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL
+from result_helpers import GoogleDriveChangesIterator
+
+
+class GoogleDriveMetadataCache:
+    """Entries metadata cache
+
+    Args:
+        max_entries (int): max number of entries kept in memory (LRU)
+        ttl (float): default entry time to live in seconds; None means no expiry
+        sqlite_path (str): path to optional SQLite file backing the memory tier
+        refresh_interval (float): min seconds between changes feed checks; None disables automatic checks
+
+    Info:
+        entries are raw API response dicts keyed by ID; entry is returned only when it contains all requested fields;
+        changes feed (changes.list) invalidates only entries which changed since the last check
+
+    Example:
+        cache = GoogleDriveMetadataCache(ttl=600, sqlite_path='/tmp/gdrive_cache.db')
+        gapi = GoogleDriveAPI(service_account_file='/path/to/config/file', metadata_cache=cache)
+        gapi.files.exists(entry_id='someId')  # API call
+        gapi.files.exists(entry_id='someId')  # served from cache
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, sqlite_path=None,
+                 refresh_interval=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = None
+        self._page_token = None
+
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS entries (id TEXT PRIMARY KEY, fields TEXT, data TEXT, expires_at REAL)'
+            )
+            self._db.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)')
+            self._db.commit()
+
+            row = self._db.execute("SELECT value FROM state WHERE key = 'page_token'").fetchone()
+            self._page_token = row[0] if row else None
+
+    # ============================== entries methods ==============================
+
+    def get(self, entry_id, fields):
+        """Handles getting cached entry
+
+        Args:
+            entry_id (str): GDrive entry ID
+            fields (tuple): requested field names
+
+        Returns:
+            (dict) API response dict or None when entry is missing, expired or lacks requested fields
+        """
+        with self._lock:
+            entry = self._entries.get(entry_id)
+
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    'SELECT fields, data, expires_at FROM entries WHERE id = ?', (entry_id,)
+                ).fetchone()
+                if row:
+                    entry = (row[2], frozenset(json.loads(row[0])), json.loads(row[1]))
+                    self._remember(entry_id, entry)
+
+            if entry is not None:
+                expires_at, cached_fields, data = entry
+
+                if expires_at is not None and expires_at < time.time():
+                    self.invalidate(entry_id)
+                elif cached_fields.issuperset(fields):
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return data
+
+            self.misses += 1
+            return None
+
+    def set(self, entry_id, fields, data, ttl=None):
+        """Handles storing entry
+
+        Args:
+            entry_id (str): GDrive entry ID
+            fields (tuple): field names contained in data
+            data (dict): API response dict
+            ttl (float): entry time to live in seconds, default: cache ttl
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        entry = (time.time() + ttl if ttl is not None else None, frozenset(fields), data)
+
+        with self._lock:
+            self._remember(entry_id, entry)
+
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO entries (id, fields, data, expires_at) VALUES (?, ?, ?, ?)',
+                    (entry_id, json.dumps(sorted(entry[1])), json.dumps(data), entry[0])
+                )
+                self._db.commit()
+
+    def _remember(self, entry_id, entry):
+        self._entries[entry_id] = entry
+        self._entries.move_to_end(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, entry_id):
+        with self._lock:
+            self._entries.pop(entry_id, None)
+
+            if self._db is not None:
+                self._db.execute('DELETE FROM entries WHERE id = ?', (entry_id,))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+            if self._db is not None:
+                self._db.execute('DELETE FROM entries')
+                self._db.commit()
+
+    # ============================== changes feed methods ==============================
+
+    def _store_page_token(self, page_token):
+        self._page_token = page_token
+
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('page_token', ?)", (page_token,))
+            self._db.commit()
+
+    def refresh(self, drive_handler):
+        """Handles invalidation of entries changed since the last check
+
+        Args:
+            drive_handler (build): Google API connection handler
+
+        Returns:
+            (int) number of invalidated entries
+        """
+        # refreshes are serialized, cache lock is held only while entries and token are updated
+        with self._refresh_lock:
+            with self._lock:
+                self._last_refresh = time.monotonic()
+                page_token = self._page_token
+
+            if page_token is None:
+                start_page_token = GoogleDriveChangesIterator.get_start_page_token(drive_handler)
+                with self._lock:
+                    # nothing can be validated without start point; entries cached so far are dropped
+                    self.clear()
+                    self._store_page_token(start_page_token)
+                return 0
+
+            # changes feed is downloaded without cache lock, so get() and set() do not wait for it
+            changes = GoogleDriveChangesIterator(drive_handler, page_token, fields='fileId')
+            entry_ids = [change.get('fileId') for change in changes]
+
+            with self._lock:
+                for entry_id in entry_ids:
+                    self._entries.pop(entry_id, None)
+
+                if self._db is not None:
+                    self._db.executemany('DELETE FROM entries WHERE id = ?', [(entry_id,) for entry_id in entry_ids])
+                    self._db.commit()
+
+                self._store_page_token(changes.new_start_page_token)
+
+        return len(entry_ids)
+
+    def maybe_refresh(self, drive_handler):
+        """Handles refresh when refresh_interval elapsed since the last check"""
+        if self.refresh_interval is None:
+            return
+
+        if self._last_refresh is None or time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh(drive_handler)
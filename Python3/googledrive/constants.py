@@ -1,6 +1,37 @@
 # base fields list; by default Google API handles kind, id, name, mimeType fields
 DEFAULT_FIELDS = 'kind, id, name, mimeType, size'
 
+# max value of pageSize param accepted by files.list API call
+MAX_PAGE_SIZE = 1000
+
+# max number of requests in single batch API call
+BATCH_MAX_SIZE = 100
+
+# max length of 'q' param used when packing many conditions into single query
+MAX_QUERY_LENGTH = 2000
+
+# default number of worker threads for concurrent transfers
+DEFAULT_TRANSFER_WORKERS = 4
+
+# default chunk size of streaming downloads
+DEFAULT_DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# default size of single byte range of parallel downloads
+DEFAULT_DOWNLOAD_PART_SIZE = 32 * 1024 * 1024
+
+# default chunk size for resumable uploads; must be multiple of 256 KB
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# default metadata cache size (entries) and entry time to live (seconds)
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 300
+
+# default max number of simultaneously open connections of asyncio client
+DEFAULT_CONNECTION_LIMIT = 100
+
+# default fields of changes feed entries
+DEFAULT_CHANGE_FIELDS = 'fileId, removed, file({})'.format(DEFAULT_FIELDS)
+
 
 class MimeType:
     """Abstract class for holding mime types
@@ -9,3 +40,21 @@ class MimeType:
     DEFAULT_MIME_TYPE = 'application/octet-stream'
     BINARY_MIME_TYPE = 'application/octet-stream'
     GOOGLE_FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+    GOOGLE_SHORTCUT_MIME_TYPE = 'application/vnd.google-apps.shortcut'
+
+# Drive API calls rate limit (requests per second): initial value and bounds of adaptive adjustment
+DEFAULT_RATE_LIMIT = 100
+MIN_RATE_LIMIT = 1
+MAX_RATE_LIMIT = 200
+
+# retries of quota and server errors with exponential backoff (seconds)
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1
+DEFAULT_BACKOFF_MAX = 32
+
+# content hashing read size and lifetime of folder content hashes index (seconds)
+DEFAULT_HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MD5_INDEX_TTL = 300
+
+# API call latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+
+from constants import DEFAULT_HASH_CHUNK_SIZE, DEFAULT_MD5_INDEX_TTL, MimeType
+
+
+def file_md5(path, chunk_size=DEFAULT_HASH_CHUNK_SIZE):
+    """Handles streaming MD5 computation of local file
+
+    Args:
+        path (str): local file path
+        chunk_size (int): bytes read at once; memory use does not depend on file size
+
+    Returns:
+        (str) hex digest, comparable with Drive md5Checksum field
+    """
+    md5 = hashlib.md5()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+
+    with open(path, 'rb', buffering=0) as file_handler:
+        while True:
+            size = file_handler.readinto(buffer)
+            if not size:
+                break
+            md5.update(view[:size])
+
+    return md5.hexdigest()
+
+
+class GoogleDriveMD5Index:
+    """Per folder index of binary files content hashes
+
+    Args:
+        gapi_instance (GoogleDriveAPI): api instance
+        ttl (float): seconds after which folder listing is fetched again; None means no expiry
+
+    Info:
+        folder is listed once (id, name, size and md5Checksum of not trashed binary files, targets of shortcuts)
+        and kept in memory;
+        files uploaded through GoogleDriveFile.upload_file_dedup() are added to the index without listing again;
+        Google Docs files have no md5Checksum, so they are never matched
+
+    Example:
+        gapi.md5_index.find('someFolderId', file_md5('/tmp/a.bin'))
+        gapi.md5_index.invalidate('someFolderId')
+    """
+
+    def __init__(self, gapi_instance, ttl=DEFAULT_MD5_INDEX_TTL):
+        self.gapi_instance = gapi_instance
+        self.ttl = ttl
+
+        self._folders = {}
+        self._lock = threading.Lock()
+
+    def _list_folder(self, folder_id):
+        index = {'hashes': {}, 'shortcuts': {}}
+        entries = self.gapi_instance.files.filter(parents=folder_id, trashed=False).exclude(
+            mime_type=MimeType.GOOGLE_FOLDER_MIME_TYPE
+        ).values_list('md5Checksum', 'id', 'name', 'size', 'shortcutDetails')
+
+        for md5_checksum, entry_id, name, size, shortcut_details in entries.iterator():
+            if md5_checksum:
+                index['hashes'].setdefault(md5_checksum, []).append((entry_id, name, size))
+            if shortcut_details.get('targetId'):
+                index['shortcuts'].setdefault(shortcut_details['targetId'], []).append((entry_id, name))
+        return index
+
+    def folder(self, folder_id):
+        """Handles getting folder index
+
+        Args:
+            folder_id (str): GDrive folder ID
+
+        Returns:
+            (dict) 'hashes': md5Checksum -> (ID, name, size) list, 'shortcuts': target ID -> (ID, name) list
+        """
+        with self._lock:
+            cached = self._folders.get(folder_id)
+
+        if cached is not None and (self.ttl is None or cached[0] > time.monotonic()):
+            return cached[1]
+
+        index = self._list_folder(folder_id)
+        with self._lock:
+            self._folders[folder_id] = (time.monotonic() + self.ttl if self.ttl is not None else None, index)
+        return index
+
+    def find(self, folder_id, md5_checksum, size=None, name=None):
+        """Handles finding file with given content in folder
+
+        Args:
+            folder_id (str): GDrive folder ID
+            md5_checksum (str): content MD5 hex digest
+            size (int): content size, checked when given
+            name (str): preferred file name; file with other name is returned when there is no name match
+
+        Returns:
+            (tuple) (ID, name, size) of matching file or None
+        """
+        matches = [
+            entry for entry in self.folder(folder_id)['hashes'].get(md5_checksum, [])
+            if size is None or entry[2] == size
+        ]
+        named = [entry for entry in matches if entry[1] == name]
+        return (named or matches or [None])[0]
+
+    def find_shortcut(self, folder_id, target_id, name=None):
+        """Handles finding shortcut to given entry in folder
+
+        Args:
+            folder_id (str): GDrive folder ID
+            target_id (str): shortcut target ID
+            name (str): shortcut name, checked when given
+
+        Returns:
+            (str) shortcut ID or None
+        """
+        for shortcut_id, shortcut_name in self.folder(folder_id)['shortcuts'].get(target_id, []):
+            if name is None or shortcut_name == name:
+                return shortcut_id
+        return None
+
+    def add(self, folder_id, md5_checksum, entry_id, name, size):
+        """Handles adding uploaded file to already listed folder index"""
+        with self._lock:
+            cached = self._folders.get(folder_id)
+            if cached is not None:
+                cached[1]['hashes'].setdefault(md5_checksum, []).append((entry_id, name, size))
+
+    def add_shortcut(self, folder_id, target_id, shortcut_id, name):
+        """Handles adding created shortcut to already listed folder index"""
+        with self._lock:
+            cached = self._folders.get(folder_id)
+            if cached is not None:
+                cached[1]['shortcuts'].setdefault(target_id, []).append((shortcut_id, name))
+
+    def invalidate(self, folder_id=None):
+        """Handles dropping folder index, all folders when folder_id is not given"""
+        with self._lock:
+            if folder_id is None:
+                self._folders.clear()
+            else:
+                self._folders.pop(folder_id, None)
@@ -25,3 +25,9 @@ class ResponseFormatGAPIException(Exception):
     """raises when too few fields in query response declaration
     """
     pass
+
+
+class QueryFormatGAPIException(Exception):
+    """raises when query lookups cannot be compiled to Google Drive search query
+    """
+    pass
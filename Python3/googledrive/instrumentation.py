@@ -0,0 +1,186 @@
+import socket
+import threading
+from collections import defaultdict, namedtuple
+
+from constants import LATENCY_BUCKETS
+
+# single API call: method ID (eg. 'drive.files.list'), latency in seconds including retries,
+# transferred bytes (request and response bodies), number of retries and whether the call failed
+GoogleDriveCallRecord = namedtuple('GoogleDriveCallRecord', ['method', 'latency', 'bytes', 'retries', 'error'])
+
+# process-wide hooks called with GoogleDriveCallRecord after every API call
+instrumentation_hooks = []
+
+
+def add_instrumentation_hook(hook):
+    """Register hook called after every API call
+
+    Args:
+        hook (callable): called with GoogleDriveCallRecord, eg. GoogleDriveMetrics instance
+
+    Example:
+        metrics = add_instrumentation_hook(GoogleDriveMetrics())
+        gapi.folders.walk('someId')
+        print(metrics.prometheus_text())
+    """
+    instrumentation_hooks.append(hook)
+    return hook
+
+
+def remove_instrumentation_hook(hook):
+    if hook in instrumentation_hooks:
+        instrumentation_hooks.remove(hook)
+
+
+def record_call(method, latency, size=0, retries=0, error=False):
+    """Handles passing API call record to registered hooks"""
+    if not instrumentation_hooks:
+        return
+
+    record = GoogleDriveCallRecord(method or 'unknown', latency, size, retries, error)
+    for hook in list(instrumentation_hooks):
+        hook(record)
+
+
+def request_method(request):
+    """Handles getting method ID of googleapiclient request, eg. 'drive.files.list'
+
+    Info:
+        media downloads share method ID with files.get, so they are reported as 'drive.files.get_media'
+    """
+    method = getattr(request, 'methodId', None) or 'unknown'
+    if 'alt=media' in (getattr(request, 'uri', None) or ''):
+        return '{}_media'.format(method)
+    return method
+
+
+class GoogleDriveMetrics:
+    """API calls metrics collector
+
+    Args:
+        buckets (tuple): latency histogram upper bounds in seconds
+
+    Info:
+        keeps per method counters (calls, errors, retries, bytes) and latency histogram;
+        exported in Prometheus text exposition format or as statsd lines
+
+    Example:
+        metrics = add_instrumentation_hook(GoogleDriveMetrics())
+        metrics.snapshot()['drive.files.list']['calls']
+        metrics.prometheus_text()
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._methods = defaultdict(lambda: {
+                'calls': 0, 'errors': 0, 'retries': 0, 'bytes': 0, 'latency_sum': 0.0,
+                'latency_buckets': [0] * len(self.buckets)
+            })
+
+    def __call__(self, record):
+        with self._lock:
+            stats = self._methods[record.method]
+            stats['calls'] += 1
+            stats['errors'] += int(record.error)
+            stats['retries'] += record.retries
+            stats['bytes'] += record.bytes
+            stats['latency_sum'] += record.latency
+
+            for index, bound in enumerate(self.buckets):
+                if record.latency <= bound:
+                    stats['latency_buckets'][index] += 1
+
+    def snapshot(self):
+        """Handles getting collected metrics
+
+        Returns:
+            (dict) method -> metrics dict
+        """
+        with self._lock:
+            return {method: dict(stats, latency_buckets=list(stats['latency_buckets']))
+                    for method, stats in self._methods.items()}
+
+    def prometheus_text(self, prefix='googledrive_api'):
+        """Handles export in Prometheus text exposition format
+
+        Returns:
+            (str) metrics text, eg. for /metrics endpoint
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        for name, key, help_text in (
+            ('calls_total', 'calls', 'API calls'),
+            ('errors_total', 'errors', 'Failed API calls'),
+            ('retries_total', 'retries', 'Retried API requests'),
+            ('bytes_total', 'bytes', 'Transferred request and response body bytes'),
+        ):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+            lines.append('# TYPE {}_{} counter'.format(prefix, name))
+            for method, stats in sorted(snapshot.items()):
+                lines.append('{}_{}{{method="{}"}} {}'.format(prefix, name, method, stats[key]))
+
+        lines.append('# HELP {}_latency_seconds API call latency including retries'.format(prefix))
+        lines.append('# TYPE {}_latency_seconds histogram'.format(prefix))
+        for method, stats in sorted(snapshot.items()):
+            for bound, count in zip(self.buckets, stats['latency_buckets']):
+                lines.append('{}_latency_seconds_bucket{{method="{}",le="{}"}} {}'.format(prefix, method, bound, count))
+            lines.append('{}_latency_seconds_bucket{{method="{}",le="+Inf"}} {}'.format(prefix, method, stats['calls']))
+            lines.append('{}_latency_seconds_sum{{method="{}"}} {}'.format(prefix, method, stats['latency_sum']))
+            lines.append('{}_latency_seconds_count{{method="{}"}} {}'.format(prefix, method, stats['calls']))
+
+        return '\n'.join(lines) + '\n'
+
+    def statsd_lines(self, prefix='googledrive.api'):
+        """Handles export as statsd gauges of current totals
+
+        Returns:
+            (list) statsd lines, eg. 'googledrive.api.drive_files_list.calls:10|g'
+        """
+        lines = []
+        for method, stats in sorted(self.snapshot().items()):
+            metric = '{}.{}'.format(prefix, method.replace('.', '_'))
+            for key in ('calls', 'errors', 'retries', 'bytes'):
+                lines.append('{}.{}:{}|g'.format(metric, key, stats[key]))
+        return lines
+
+
+class GoogleDriveStatsdHook:
+    """Hook sending every API call to statsd over UDP
+
+    Args:
+        host (str): statsd host
+        port (int): statsd port
+        prefix (str): metrics prefix
+
+    Example:
+        add_instrumentation_hook(GoogleDriveStatsdHook('localhost', 8125))
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='googledrive.api'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, record):
+        metric = '{}.{}'.format(self.prefix, record.method.replace('.', '_'))
+        lines = [
+            '{}.calls:1|c'.format(metric),
+            '{}.latency:{:.3f}|ms'.format(metric, record.latency * 1000),
+            '{}.bytes:{}|c'.format(metric, record.bytes),
+        ]
+        if record.retries:
+            lines.append('{}.retries:{}|c'.format(metric, record.retries))
+        if record.error:
+            lines.append('{}.errors:1|c'.format(metric))
+
+        try:
+            self.sock.sendto('\n'.join(lines).encode('utf-8'), self.address)
+        except OSError:
+            # metrics must never break API calls
+            pass
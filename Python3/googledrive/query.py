@@ -0,0 +1,274 @@
+import datetime
+import operator
+
+from exceptions import QueryFormatGAPIException
+
+# queryset field name -> Drive API field name; camelCase API names are accepted as well
+QUERY_FIELDS = {
+    'name': 'name',
+    'full_text': 'fullText',
+    'mime_type': 'mimeType',
+    'modified_time': 'modifiedTime',
+    'viewed_by_me_time': 'viewedByMeTime',
+    'created_time': 'createdTime',
+    'shared_with_me_time': 'sharedWithMeTime',
+    'trashed': 'trashed',
+    'starred': 'starred',
+    'shared_with_me': 'sharedWithMe',
+    'visibility': 'visibility',
+    'parents': 'parents',
+    'owners': 'owners',
+    'writers': 'writers',
+    'readers': 'readers',
+}
+
+# lookups supported by Drive search query per field kind
+STRING_LOOKUPS = ('exact', 'ne', 'contains', 'in')
+TIME_LOOKUPS = ('exact', 'ne', 'lt', 'lte', 'gt', 'gte', 'in')
+BOOL_LOOKUPS = ('exact', 'ne')
+COLLECTION_LOOKUPS = ('exact', 'in')
+
+FIELD_LOOKUPS = {
+    'name': STRING_LOOKUPS,
+    'fullText': ('contains',),
+    'mimeType': STRING_LOOKUPS,
+    'modifiedTime': TIME_LOOKUPS,
+    'viewedByMeTime': TIME_LOOKUPS,
+    'createdTime': TIME_LOOKUPS,
+    'sharedWithMeTime': TIME_LOOKUPS,
+    'trashed': BOOL_LOOKUPS,
+    'starred': BOOL_LOOKUPS,
+    'sharedWithMe': BOOL_LOOKUPS,
+    'visibility': ('exact', 'ne', 'in'),
+    'parents': COLLECTION_LOOKUPS,
+    'owners': COLLECTION_LOOKUPS,
+    'writers': COLLECTION_LOOKUPS,
+    'readers': COLLECTION_LOOKUPS,
+}
+
+QUERY_OPERATORS = {
+    'exact': '=',
+    'ne': '!=',
+    'lt': '<',
+    'lte': '<=',
+    'gt': '>',
+    'gte': '>=',
+    'contains': 'contains',
+}
+
+# fields which cannot be used in Drive search query; filtered client-side on response dicts
+LOCAL_FIELDS = {
+    'size': ('size', int),
+    'quota_bytes_used': ('quotaBytesUsed', int),
+    'quotaBytesUsed': ('quotaBytesUsed', int),
+}
+
+LOCAL_OPERATORS = {
+    'exact': operator.eq,
+    'ne': operator.ne,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'in': lambda value, values: value in values,
+}
+
+ORDER_FIELDS = {
+    'created_time': 'createdTime',
+    'modified_by_me_time': 'modifiedByMeTime',
+    'modified_time': 'modifiedTime',
+    'name_natural': 'name_natural',
+    'quota_bytes_used': 'quotaBytesUsed',
+    'shared_with_me_time': 'sharedWithMeTime',
+    'viewed_by_me_time': 'viewedByMeTime',
+}
+
+
+def format_value(value):
+    """Handles formatting value as Drive search query literal
+
+    Args:
+        value (str, bool, datetime, date): lookup value
+
+    Returns:
+        (str) query literal; strings are quoted with escaped quotes and backslashes,
+        datetimes are formatted as RFC 3339 (naive datetimes are treated as UTC)
+    """
+
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        value = value.isoformat(timespec='seconds')
+    elif isinstance(value, datetime.date):
+        value = '{}T00:00:00'.format(value.isoformat())
+
+    return "'{}'".format(str(value).replace('\\', '\\\\').replace("'", "\\'"))
+
+
+def split_lookup(lookup):
+    """Handles splitting lookup into field name and lookup type, eg. 'name__contains' -> ('name', 'contains')"""
+    field, _, lookup_type = lookup.partition('__')
+    return field, lookup_type or 'exact'
+
+
+class GoogleDriveQuery:
+    """Google Drive search query builder
+
+    Info:
+        filter() lookup groups are joined with 'and', exclude() groups are negated with 'not';
+        lookups of fields which are not searchable (eg. size) are evaluated client-side, see matches()
+
+    Example:
+        query = GoogleDriveQuery()
+        query.add({'name__contains': 'report', 'trashed': False})
+        query.add({'mime_type': 'application/pdf'}, negate=True)
+        query.compile()  # "name contains 'report' and trashed = false and not (mimeType = 'application/pdf')"
+    """
+
+    def __init__(self):
+        self.conditions = []
+        self.local_conditions = []
+        self.ordering = ()
+
+    def clone(self):
+        clone = GoogleDriveQuery()
+        clone.conditions = list(self.conditions)
+        clone.local_conditions = list(self.local_conditions)
+        clone.ordering = self.ordering
+        return clone
+
+    # ============================== filtering ==============================
+
+    @staticmethod
+    def _compile_lookup(field, lookup_type, value):
+        api_field = QUERY_FIELDS.get(field, field)
+        lookups = FIELD_LOOKUPS.get(api_field)
+
+        if lookups is None:
+            raise QueryFormatGAPIException("Field '{}' cannot be used in query".format(field))
+        if lookup_type not in lookups:
+            raise QueryFormatGAPIException("Lookup '{}' is not supported by '{}' field".format(lookup_type, field))
+
+        if lookup_type == 'in':
+            values = list(value)
+            if not values:
+                raise QueryFormatGAPIException("Lookup '{}__in' requires at least one value".format(field))
+            return '({})'.format(' or '.join(
+                GoogleDriveQuery._compile_lookup(field, 'exact', elem) for elem in values
+            ))
+
+        if lookups is COLLECTION_LOOKUPS:
+            return '{} in {}'.format(format_value(value), api_field)
+
+        return '{} {} {}'.format(api_field, QUERY_OPERATORS[lookup_type], format_value(value))
+
+    @staticmethod
+    def _local_lookup(field, lookup_type, value):
+        api_field, value_type = LOCAL_FIELDS[field]
+
+        if lookup_type not in LOCAL_OPERATORS:
+            raise QueryFormatGAPIException("Lookup '{}' is not supported by '{}' field".format(lookup_type, field))
+
+        compare = LOCAL_OPERATORS[lookup_type]
+        value = [value_type(elem) for elem in value] if lookup_type == 'in' else value_type(value)
+
+        def matches(result_dict):
+            if result_dict.get(api_field) is None:
+                return False
+            return compare(value_type(result_dict[api_field]), value)
+
+        return api_field, matches
+
+    def add(self, lookups, negate=False):
+        """Handles adding lookups group
+
+        Args:
+            lookups (dict): lookup -> value, eg. {'modified_time__gt': datetime(2020, 1, 1)}
+            negate (bool): whether group should be excluded
+
+        Raises:
+            QueryFormatGAPIException when lookup is not supported
+        """
+
+        terms = []
+        local_terms = []
+
+        for lookup, value in lookups.items():
+            field, lookup_type = split_lookup(lookup)
+
+            if field in LOCAL_FIELDS:
+                local_terms.append(self._local_lookup(field, lookup_type, value))
+            else:
+                terms.append(self._compile_lookup(field, lookup_type, value))
+
+        if negate:
+            if terms and local_terms:
+                raise QueryFormatGAPIException(
+                    'Single exclude() call cannot mix searchable fields with {}'.format(', '.join(LOCAL_FIELDS))
+                )
+            if terms:
+                terms = ['not ({})'.format(' and '.join(terms))]
+            if local_terms:
+                fields = tuple(api_field for api_field, _ in local_terms)
+                checks = tuple(check for _, check in local_terms)
+                local_terms = [(fields, lambda result_dict: not all(check(result_dict) for check in checks))]
+        else:
+            local_terms = [((api_field,), check) for api_field, check in local_terms]
+
+        self.conditions.extend(terms)
+        self.local_conditions.extend(local_terms)
+
+    def compile(self):
+        """Handles compiling conditions
+
+        Returns:
+            (str) Drive search query or None when there are no searchable conditions
+        """
+
+        return ' and '.join(self.conditions) or None
+
+    @property
+    def local_fields(self):
+        """Field names needed by client-side conditions"""
+        return tuple(field for fields, _ in self.local_conditions for field in fields)
+
+    def matches(self, result_dict):
+        """Handles evaluating client-side conditions
+
+        Args:
+            result_dict (dict): API response dict
+
+        Returns:
+            (bool) whether entry matches all conditions
+        """
+
+        return all(check(result_dict) for _, check in self.local_conditions)
+
+    # ============================== ordering ==============================
+
+    def set_ordering(self, fields):
+        """Handles setting result ordering
+
+        Args:
+            fields (tuple): field names, '-' prefix means descending order, eg. ('-modified_time', 'name')
+        """
+
+        self.ordering = tuple(fields)
+
+    def compile_ordering(self):
+        """Handles compiling ordering
+
+        Returns:
+            (str) Drive orderBy param or None when ordering is not set
+        """
+
+        keys = []
+        for field in self.ordering:
+            descending = field.startswith('-')
+            field = field.lstrip('-')
+            api_field = ORDER_FIELDS.get(field, QUERY_FIELDS.get(field, field))
+            keys.append('{} desc'.format(api_field) if descending else api_field)
+        return ','.join(keys) or None
@@ -1,18 +1,151 @@
+import contextlib
 import copy
-
-from constants import DEFAULT_FIELDS, MimeType
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import DEFAULT_DOWNLOAD_CHUNK_SIZE, DEFAULT_DOWNLOAD_PART_SIZE, DEFAULT_FIELDS, \
+    DEFAULT_TRANSFER_WORKERS, DEFAULT_UPLOAD_CHUNK_SIZE, MimeType
+from dedup import file_md5
 from exceptions import MultipleObjectsReturnedGAPIException, ArgumentNotFoundGAPIException
-from result_helpers import GoogleDriveFileDownloader, GoogleDriveFileUploader
+from query import GoogleDriveQuery
+from result_helpers import GoogleDriveFileDownloader, GoogleDriveFileStreamer, GoogleDriveFileUploader, \
+    GoogleDriveListIterator, GoogleDriveRangedDownloader, GoogleDriveResult, parse_fields
+from transfers import GoogleDriveDownloadManager
 
 
 class GoogleDriveEntry:
     """Google Drive Entry abstract class
 
     contains method to get or list data from Google API
+
+    Info:
+        filter(), exclude(), order_by() and all() return lazy queryset copies; conditions are compiled
+        to single Drive search query (see query.GoogleDriveQuery) and sent when queryset is evaluated
+        (iteration, indexing, len(), count());
+        only() and values_list() return queryset copies sending minimal fields mask to the API;
+        'mimeType' is added to the mask when mime type check needs it
+
+    Example:
+        gapi.files.filter(modified_time__gt=datetime(2020, 1, 1), name__contains='report').exclude(trashed=True)
+        gapi.folders.filter(parents='someId').order_by('-modified_time', 'name')[:10]
+        gapi.files.only('id', 'name').filter(name='test')
+        gapi.folders.values_list('id', 'name').all()  # (id, name) tuples
+        gapi.files.values_list('id', flat=True).all()  # IDs
     """
 
     def __init__(self, gapi_instance):
         self.gapi_instance = gapi_instance
+        self.only_fields = None
+        self.values_fields = None
+        self.values_flat = False
+
+        # lazy queryset state
+        self.query = None
+        self.mime_type = None
+        self.fields = ''
+        self.more_fields = ''
+        self._iterator = None
+
+    def _clone(self, **attrs):
+        clone = copy.copy(self)
+        clone._iterator = None
+        clone.__dict__.update(attrs)
+        return clone
+
+    def _query_clone(self, fields='', more_fields=''):
+        """Handles lazy queryset copy; selected mime type is taken over from api instance on the first call"""
+
+        clone = self._clone(fields=fields or self.fields, more_fields=more_fields or self.more_fields)
+
+        if self.query is None:
+            clone.mime_type = self._pop_mime_type()
+            clone.query = GoogleDriveQuery()
+        else:
+            clone.query = self.query.clone()
+
+        return clone
+
+    def only(self, *fields):
+        """Restrict fields mask
+
+        Args:
+            fields (str): field names, which should be download with Google API response
+
+        Returns:
+            queryset copy (GoogleDriveEntry)
+        """
+
+        if not fields:
+            raise ArgumentNotFoundGAPIException("You must pass at least one field name")
+
+        return self._clone(only_fields=fields)
+
+    def values_list(self, *fields, flat=False):
+        """Restrict fields mask and return values tuples instead of GoogleDriveResult instances
+
+        Args:
+            fields (str): field names, which should be download with Google API response
+            flat (bool): return single values instead of one-element tuples; valid with single field only
+
+        Returns:
+            queryset copy (GoogleDriveEntry)
+        """
+
+        if not fields:
+            raise ArgumentNotFoundGAPIException("You must pass at least one field name")
+
+        if flat and len(fields) != 1:
+            raise ArgumentNotFoundGAPIException("'flat' is valid only with single field")
+
+        return self._clone(values_fields=fields, values_flat=flat)
+
+    def _pop_mime_type(self):
+        if self.query is not None:
+            return self.mime_type
+
+        mime_type = self.gapi_instance.current_mime_type
+        self.gapi_instance.current_mime_type = None
+        return copy.deepcopy(mime_type)
+
+    def _selected_fields(self, fields='', more_fields='', mime_type=None):
+        """Fields mask planner
+
+        Args:
+            fields (str): comma separated field names, used when no only()/values_list() fields are set
+            more_fields (str): comma separated field names - additional field names to join
+            mime_type (str): checked MIME type, requires 'mimeType' field
+
+        Returns:
+            (str) comma separated field names
+        """
+
+        fields = ', '.join(self.values_fields or self.only_fields or ()) or fields or DEFAULT_FIELDS
+        selected_fields = parse_fields('{}, {}'.format(fields, more_fields) if more_fields else fields)
+
+        if mime_type and 'mimeType' not in selected_fields:
+            selected_fields += ('mimeType',)
+
+        return ', '.join(selected_fields)
+
+    def _values(self, result):
+        """Handles converting results to values tuples when values_list() is used"""
+
+        if not self.values_fields:
+            return result
+
+        if isinstance(result, GoogleDriveListIterator):
+            return result.values_list(*self.values_fields, flat=self.values_flat)
+
+        if isinstance(result, GoogleDriveResult):
+            values = result.values_list(*self.values_fields)
+            return values[0] if self.values_flat else values
+
+        if isinstance(result, list):
+            return [self._values(elem) if isinstance(elem, GoogleDriveResult) else elem for elem in result]
+
+        return result
 
     def get(self, entry_id=None, name=None, fields='', more_fields=''):
         """Basic get data method
@@ -28,12 +161,7 @@ class GoogleDriveEntry:
         """
 
         func_name = None
-        param_instance = None
-
-        fields = fields or DEFAULT_FIELDS
-        params = {
-            'selected_fields': '{}, {}'.format(fields, more_fields) if more_fields else fields
-        }
+        params = {}
 
         if entry_id:
             func_name = 'get_gfile_meta_by_id'
@@ -44,37 +172,81 @@ class GoogleDriveEntry:
         else:
             raise ArgumentNotFoundGAPIException("You must pass 'entry_id' or 'name' parameter")
 
-        if self.gapi_instance.current_mime_type:
-            mime_pass_through = copy.deepcopy(self.gapi_instance.current_mime_type)
-            self.gapi_instance.current_mime_type = None
-            params['mime_type'] = mime_pass_through
+        mime_type = self._pop_mime_type()
+        if mime_type:
+            params['mime_type'] = mime_type
+        params['selected_fields'] = self._selected_fields(fields, more_fields, mime_type)
+
+        return self._values(getattr(self.gapi_instance, func_name)(**params))
+
+    def get_many(self, ids, fields='', more_fields=''):
+        """Batch get data method
+
+        Args:
+            ids (list): ids of Google Drive`s entries/binary files/folders
+            fields (str): comma separated field names, which should be download with Google API response
+            more_fields (str): comma separated field names - additional field names to join to default fields
+
+        Returns:
+            Google API data (list) - GoogleDriveResult or EntryDoesNotExistGAPIException instances in ids order
+        """
 
-        return getattr(self.gapi_instance, func_name)(**params)
+        params = {}
 
-    def filter(self, name, fields='', more_fields=''):
+        mime_type = self._pop_mime_type()
+        if mime_type:
+            params['mime_type'] = mime_type
+        params['fields'] = self._selected_fields(fields, more_fields, mime_type)
+
+        return self._values(self.gapi_instance.get_many(ids, **params))
+
+    def filter(self, name=None, fields='', more_fields='', **lookups):
         """Basic list elements with data method
 
         Args:
             name (str): name of Google Drive`s entry/binary file/folder
             fields (str): comma separated field names, which should be download with Google API response
             more_fields (str): comma separated field names - additional field names to join to default fields
+            lookups: Django-style lookups, eg. modified_time__gt=datetime(2020, 1, 1), name__contains='test'
 
         Returns:
-            Google API data (list)
+            lazy queryset copy (GoogleDriveEntry)
         """
 
-        fields = fields or DEFAULT_FIELDS
-        params = {
-            'name': name,
-            'selected_fields': '{}, {}'.format(fields, more_fields) if more_fields else fields
-        }
+        if name is not None:
+            lookups['name'] = name
+
+        clone = self._query_clone(fields, more_fields)
+        clone.query.add(lookups)
+        return clone
+
+    def exclude(self, **lookups):
+        """Basic exclude elements method
+
+        Args:
+            lookups: Django-style lookups, eg. mime_type__in=['image/png', 'image/jpeg']
+
+        Returns:
+            lazy queryset copy (GoogleDriveEntry)
+        """
 
-        if self.gapi_instance.current_mime_type:
-            mime_pass_through = copy.deepcopy(self.gapi_instance.current_mime_type)
-            self.gapi_instance.current_mime_type = None
-            params['mime_type'] = mime_pass_through
+        clone = self._query_clone()
+        clone.query.add(lookups, negate=True)
+        return clone
 
-        return self.gapi_instance.get_gfiles_meta_by_name(**params)
+    def order_by(self, *fields):
+        """Basic ordering method
+
+        Args:
+            fields (str): field names, '-' prefix means descending order, eg. '-modified_time'
+
+        Returns:
+            lazy queryset copy (GoogleDriveEntry)
+        """
+
+        clone = self._query_clone()
+        clone.query.set_ordering(fields)
+        return clone
 
     def all(self, fields='', more_fields=''):
         """Basic list of all elements
@@ -84,20 +256,59 @@ class GoogleDriveEntry:
             more_fields (str): comma separated field names - additional field names to join to default fields
 
         Returns:
-            Google API data (list)
+            lazy queryset copy (GoogleDriveEntry)
         """
 
-        fields = fields or DEFAULT_FIELDS
-        params = {
-            'selected_fields': '{}, {}'.format(fields, more_fields) if more_fields else fields
-        }
+        return self._query_clone(fields, more_fields)
+
+    # ============================== lazy queryset evaluation ==============================
+
+    def _fetch_iterator(self):
+        """Handles query execution, once per queryset
+
+        Returns:
+            (GoogleDriveListIterator) API results iterator
+        """
+
+        if self._iterator is None:
+            if self.query is None:
+                self.mime_type = self._pop_mime_type()
+                self.query = GoogleDriveQuery()
+
+            query = self.query.compile()
+            if self.mime_type:
+                mime_condition = self.gapi_instance._query_from_dict({'mimeType': self.mime_type})
+                query = '{} and {}'.format(mime_condition, query) if query else mime_condition
+
+            # fields evaluated client-side have to be downloaded
+            more_fields = ', '.join(field for field in (self.more_fields,) + self.query.local_fields if field)
+
+            self._iterator = self._values(self.gapi_instance.get_gfiles_meta_by_query(
+                query, order_by=self.query.compile_ordering(),
+                selected_fields=self._selected_fields(self.fields, more_fields),
+                element_filter=self.query.matches if self.query.local_conditions else None
+            ))
+
+        return self._iterator
+
+    def __iter__(self):
+        return iter(self._fetch_iterator())
+
+    def __getitem__(self, index):
+        return self._fetch_iterator()[index]
 
-        if self.gapi_instance.current_mime_type:
-            mime_pass_through = copy.deepcopy(self.gapi_instance.current_mime_type)
-            self.gapi_instance.current_mime_type = None
-            params['mime_type'] = mime_pass_through
+    def __len__(self):
+        return len(self._fetch_iterator())
 
-        return self.gapi_instance.get_gfiles_meta(**params)
+    def count(self):
+        return self._fetch_iterator().count()
+
+    def iterator(self, cache=False):
+        return self._fetch_iterator().iterator(cache=cache)
+
+    def close(self):
+        if self._iterator is not None:
+            self._iterator.close()
 
     def exists(self, entry_id=None, name=None):
         """Basic exists data method
@@ -107,11 +318,15 @@ class GoogleDriveEntry:
             name (str): name of Google Drive`s entry/binary file/folder
 
         Returns:
-            info (bool)
+            info (bool); without entry_id and name tells whether lazy queryset is not empty
         """
 
+        if not entry_id and not name and self.query is not None:
+            return bool(self._clone(only_fields=('id',), values_fields=None)[:1])
+
         try:
-            result = self.get(entry_id=entry_id, name=name)
+            # only ID is needed to check existence
+            result = self._clone(only_fields=('id',), values_fields=None).get(entry_id=entry_id, name=name)
             if result and result.id is not None:
                 return True
             return False
@@ -127,15 +342,115 @@ class GoogleDriveFile(GoogleDriveEntry):
     contains method to get or list data from Google API
     """
 
-    def upload_file(self, file_name, full_path, parent_folder_id=None):
-        uploader = GoogleDriveFileUploader(file_name, full_path, parent_folder_id)
-        return uploader.upload(self.gapi_instance.drive_handler)
+    def upload_file(self, file_name, full_path, parent_folder_id=None, resumable=False,
+                    chunk_size=DEFAULT_UPLOAD_CHUNK_SIZE, show_progress=False):
+        uploader = GoogleDriveFileUploader(
+            file_name, full_path, parent_folder_id, resumable=resumable, chunk_size=chunk_size
+        )
+        return uploader.upload(self.gapi_instance.drive_handler, show_progress=show_progress)
+
+    def upload_file_dedup(self, file_name, full_path, parent_folder_id, source_folder_ids=(), resumable=False,
+                          chunk_size=DEFAULT_UPLOAD_CHUNK_SIZE, show_progress=False):
+        """Upload skipping files already stored on GDrive
+
+        Args:
+            file_name (str): name of created GDrive file
+            full_path (str): local file path
+            parent_folder_id (str): target folder ID
+            source_folder_ids (iter): other folders IDs searched for identical content; when found there,
+                shortcut named file_name to that file is created in target folder instead of upload
+
+        Returns:
+            (tuple) (file ID, action), where action is 'skipped', 'shortcut' or 'uploaded'
+
+        Info:
+            local file MD5 is computed in streaming manner and compared with md5Checksum index of folders
+            (see GoogleDriveAPI.md5_index); identical content is never sent again: upload is skipped when target
+            folder has it under file_name, otherwise shortcut named file_name is created, so file_name always exists
+
+        Example:
+            gapi.files.upload_file_dedup('backup.tar', '/tmp/backup.tar', 'backupFolderId')
+        """
+        md5_index = self.gapi_instance.md5_index
+        md5_checksum = file_md5(full_path)
+        size = os.path.getsize(full_path)
+
+        existing = md5_index.find(parent_folder_id, md5_checksum, size=size, name=file_name)
+        if existing is not None and existing[1] == file_name:
+            return existing[0], 'skipped'
+
+        # same content under other name in target folder or in source folders is linked under file_name
+        targets = itertools.chain([existing], (
+            md5_index.find(folder_id, md5_checksum, size=size, name=file_name) for folder_id in source_folder_ids
+        ))
+
+        for target in targets:
+            if target is None:
+                continue
+
+            shortcut_id = md5_index.find_shortcut(parent_folder_id, target[0], name=file_name)
+            if shortcut_id is not None:
+                return shortcut_id, 'skipped'
+
+            shortcut_id = self.gapi_instance.create_shortcut(file_name, target[0], parents=[parent_folder_id])
+            md5_index.add_shortcut(parent_folder_id, target[0], shortcut_id, file_name)
+            return shortcut_id, 'shortcut'
+
+        file_id = self.upload_file(
+            file_name, full_path, parent_folder_id, resumable=resumable, chunk_size=chunk_size,
+            show_progress=show_progress
+        )
+        md5_index.add(parent_folder_id, md5_checksum, file_id, file_name, size)
+        return file_id, 'uploaded'
+
+    def get_downloader(self, file_id, file_handler=None, path=None, size=None, part_size=DEFAULT_DOWNLOAD_PART_SIZE,
+                       max_workers=DEFAULT_TRANSFER_WORKERS):
+        """File downloader
+
+        Args:
+            file_id (str): GDrive entry ID
+            file_handler: any stream object handler, eg. BytesIO
+            path (str): local file path; enables parallel ranged download into preallocated file
+            size (int): file size in bytes used by ranged download, fetched from metadata when not given
+            part_size (int): size of single byte range
+            max_workers (int): number of ranged download worker threads
+
+        Returns:
+            (GoogleDriveFileDownloader or GoogleDriveRangedDownloader) downloader instance
+
+        Example:
+            gapi.files.get_downloader('someId', path='/tmp/big.bin', max_workers=8).download()
+        """
+        if path is None:
+            return GoogleDriveFileDownloader(
+                self.gapi_instance.file_media_handler(file_id), file_handler=file_handler
+            )
+
+        if size is None:
+            size = self.gapi_instance.get_gfile_meta_by_id(file_id, selected_fields='id, size').size
 
-    def get_downloader(self, file_id, file_handler=None):
-        return GoogleDriveFileDownloader(
-            self.gapi_instance.file_media_handler(file_id), file_handler=file_handler
+        return GoogleDriveRangedDownloader(
+            self.gapi_instance.file_media_handler(file_id), path, size,
+            http_factory=lambda: self.gapi_instance.thread_http, part_size=part_size, max_workers=max_workers
         )
 
+    def get_streamer(self, file_id, chunk_size=DEFAULT_DOWNLOAD_CHUNK_SIZE):
+        return GoogleDriveFileStreamer(self.gapi_instance.file_media_handler(file_id), chunk_size=chunk_size)
+
+    def download_files(self, targets, max_workers=DEFAULT_TRANSFER_WORKERS):
+        """Concurrent download of many files
+
+        Args:
+            targets (iter): (file ID, local path) pairs
+            max_workers (int): number of worker threads
+
+        Returns:
+            (GoogleDriveDownloadManager) manager with statuses and throughput of the finished run
+        """
+        manager = GoogleDriveDownloadManager(self.gapi_instance, max_workers=max_workers)
+        manager.download(targets)
+        return manager
+
 
 class GoogleDriveFolder(GoogleDriveEntry):
     """Google Drive Folder abstract class
@@ -145,31 +460,104 @@ class GoogleDriveFolder(GoogleDriveEntry):
     """
 
     def get_files(self, entry_id, fields='', more_fields=''):
-        fields = fields or DEFAULT_FIELDS
         params = {
             'entry_id': entry_id,
             'exclude_mime_type': MimeType.GOOGLE_FOLDER_MIME_TYPE,
-            'selected_fields': '{}, {}'.format(fields, more_fields) if more_fields else fields
+            'selected_fields': self._selected_fields(fields, more_fields)
         }
 
-        return self.gapi_instance.get_gfiles_children_by_id(**params)
+        return self._values(self.gapi_instance.get_gfiles_children_by_id(**params))
 
     def get_content(self, entry_id, fields='', more_fields=''):
         params = {
             'entry_id': entry_id,
-            'selected_fields': '{}, {}'.format(fields, more_fields) if more_fields else fields
+            'selected_fields': self._selected_fields(fields, more_fields)
         }
 
-        return self.gapi_instance.get_gfiles_children_by_id(**params)
+        return self._values(self.gapi_instance.get_gfiles_children_by_id(**params))
 
     def get_subfolders(self, entry_id, fields='', more_fields=''):
         params = {
             'entry_id': entry_id,
             'mime_type': MimeType.GOOGLE_FOLDER_MIME_TYPE,
-            'selected_fields': '{}, {}'.format(fields, more_fields) if more_fields else fields
+            'selected_fields': self._selected_fields(fields, more_fields)
         }
 
-        return self.gapi_instance.get_gfiles_children_by_id(**params)
+        return self._values(self.gapi_instance.get_gfiles_children_by_id(**params))
+
+    def _list_folders(self, paths, selected_fields):
+        results = []
+
+        # worker lists with service borrowed from idle ones, which carries its own HTTP handle
+        lease = getattr(self.gapi_instance.service_factory, 'lease', None) or contextlib.nullcontext
+        with lease():
+            children = self.gapi_instance.get_gfiles_children_by_id(
+                list(paths), selected_fields=selected_fields
+            ).group()
+
+        for entry_id, path in paths.items():
+            folders, files = [], []
+            for child in children[entry_id]:
+                if child.mime_type == MimeType.GOOGLE_FOLDER_MIME_TYPE:
+                    folders.append(child)
+                else:
+                    files.append(child)
+            results.append((path, folders, files))
+
+        return results
+
+    def walk(self, root_id, max_workers=DEFAULT_TRANSFER_WORKERS, fields='', more_fields=''):
+        """Recursive folder tree traversal, breadth-first
+
+        Args:
+            root_id (str): id of Google Drive`s root folder
+            max_workers (int): number of OR queries listed concurrently
+            fields (str): comma separated field names, which should be download with Google API response
+            more_fields (str): comma separated field names - additional field names to join to default fields
+
+        Returns:
+            (generator) (path, folders, files) tuples, where folders and files are GoogleDriveResult lists
+
+        Info:
+            works like os.walk: path starts with root folder name and removing elements from folders list
+            in place prunes traversal; subfolders of every yielded folder are packed into OR queries
+            (see GoogleDriveAPI.get_gfiles_children_by_id), each listed by separate worker while next folders
+            are consumed
+
+        Example:
+            for path, folders, files in gapi.folders.walk('someId'):
+                print(path, len(files))
+        """
+        fields = fields or DEFAULT_FIELDS
+        selected_fields = parse_fields('{}, {}'.format(fields, more_fields) if more_fields else fields)
+        # id, name, mimeType and parents are required to split entries and build paths
+        selected_fields = ', '.join(
+            tuple(field for field in ('id', 'name', 'mimeType', 'parents') if field not in selected_fields) +
+            selected_fields
+        )
+
+        root = self.gapi_instance.get_gfile_meta_by_id(root_id, selected_fields='id, name')
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = deque([executor.submit(self._list_folders, {root_id: root.name}, selected_fields)])
+
+        try:
+            while pending:
+                for path, folders, files in pending.popleft().result():
+                    yield path, folders, files
+
+                    if folders:
+                        paths = {folder.id: '{}/{}'.format(path, folder.name) for folder in folders}
+                        # one task per packed OR query, so subfolders of large folder are listed by all workers
+                        for _, entry_ids in self.gapi_instance._parents_queries(list(paths)):
+                            pending.append(executor.submit(
+                                self._list_folders, {entry_id: paths[entry_id] for entry_id in entry_ids},
+                                selected_fields
+                            ))
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
 
     def create(self, name, parents=None):
         return self.gapi_instance.create_gfile(
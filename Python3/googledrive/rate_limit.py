@@ -0,0 +1,222 @@
+import asyncio
+import json
+import random
+import threading
+import time
+
+try:
+    from googleapiclient.errors import HttpError
+except ImportError:
+    HttpError = None
+
+from constants import DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX, DEFAULT_MAX_RETRIES, DEFAULT_RATE_LIMIT, \
+    MAX_RATE_LIMIT, MIN_RATE_LIMIT
+from instrumentation import instrumentation_hooks, record_call, request_method
+
+QUOTA_ERROR_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded')
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucketRateLimiter:
+    """Token bucket rate limiter with AIMD rate adjustment
+
+    Args:
+        rate (float): initial number of requests per second
+        min_rate (float): lower rate bound
+        max_rate (float): upper rate bound
+        capacity (float): max burst size, default: one second of requests at initial rate
+        increase (float): requests per second added after every successful request (additive increase)
+        decrease (float): rate multiplier applied on quota error (multiplicative decrease)
+
+    Info:
+        thread-safe; reserve() returns time to wait, so the same limiter can be used from threads and asyncio
+
+    Example:
+        limiter = TokenBucketRateLimiter(rate=50)
+        limiter.acquire()
+        await limiter.acquire_async()
+    """
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT, min_rate=MIN_RATE_LIMIT, max_rate=MAX_RATE_LIMIT, capacity=None,
+                 increase=0.1, decrease=0.5):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.capacity = float(capacity or rate)
+        self.increase = increase
+        self.decrease = decrease
+
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Handles taking tokens from the bucket
+
+        Args:
+            tokens (int): number of requests
+
+        Returns:
+            (float) seconds to wait before sending requests
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            # tokens may go below zero; the debt is paid by waiting
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens=1):
+        wait_time = self.reserve(tokens)
+        if wait_time:
+            time.sleep(wait_time)
+
+    async def acquire_async(self, tokens=1):
+        wait_time = self.reserve(tokens)
+        if wait_time:
+            await asyncio.sleep(wait_time)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_quota_error(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # drop burst allowance, so waiting requests spread out at the new rate
+            self._tokens = min(self._tokens, 0.0)
+
+
+# process-wide limiter shared by all Drive API calls
+default_rate_limiter = TokenBucketRateLimiter()
+
+
+def configure_rate_limiter(**kwargs):
+    """Replace process-wide limiter
+
+    Args:
+        kwargs: TokenBucketRateLimiter arguments
+
+    Example:
+        configure_rate_limiter(rate=20, max_rate=100)
+    """
+    global default_rate_limiter
+    default_rate_limiter = TokenBucketRateLimiter(**kwargs)
+    return default_rate_limiter
+
+
+def get_rate_limiter(limiter=None):
+    return limiter or default_rate_limiter
+
+
+def backoff_delay(retry_num, base=DEFAULT_BACKOFF_BASE, max_delay=DEFAULT_BACKOFF_MAX):
+    """Exponential backoff delay with full jitter
+
+    Args:
+        retry_num (int): retry number, starting from 0
+
+    Returns:
+        (float) seconds to sleep
+    """
+    return random.uniform(0, min(max_delay, base * 2 ** retry_num))
+
+
+def error_reason(content):
+    """Extract error reason from API error response body"""
+    try:
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        error = json.loads(content).get('error', {})
+        errors = error.get('errors') or [{}]
+        return errors[0].get('reason') or error.get('status')
+    except (ValueError, AttributeError):
+        return None
+
+
+def is_quota_error(status, content):
+    return status == 429 or (status == 403 and error_reason(content) in QUOTA_ERROR_REASONS)
+
+
+def is_retryable_error(status, content):
+    return status in RETRY_STATUSES or is_quota_error(status, content)
+
+
+def _http_error_info(err):
+    if HttpError is not None and isinstance(err, HttpError):
+        return err.resp.status, err.content
+    return None, None
+
+
+def call_with_backoff(func, tokens=1, limiter=None, max_retries=DEFAULT_MAX_RETRIES, method=None, size=None):
+    """Call Drive API function through rate limiter, retrying quota and server errors
+
+    Args:
+        func (callable): function making API call, eg. request.execute
+        tokens (int): number of API requests made by single call, eg. batch size
+        limiter (TokenBucketRateLimiter): limiter, default: process-wide limiter
+        max_retries (int): max number of retries
+        method (str): API method ID reported to instrumentation hooks, eg. 'drive.files.list'
+        size (callable): returns transferred bytes for func result, reported to instrumentation hooks
+
+    Returns:
+        func result
+
+    Example:
+        call_with_backoff(drive_handler.files().get(fileId='123').execute)
+        call_with_backoff(batch.execute, tokens=100)
+    """
+    limiter = get_rate_limiter(limiter)
+    start = time.monotonic()
+
+    for retry_num in range(max_retries + 1):
+        limiter.acquire(tokens)
+
+        try:
+            result = func()
+        except Exception as err:
+            status, content = _http_error_info(err)
+            if status is None or not is_retryable_error(status, content) or retry_num == max_retries:
+                record_call(method, time.monotonic() - start, retries=retry_num, error=True)
+                raise
+
+            if is_quota_error(status, content):
+                limiter.on_quota_error()
+            time.sleep(backoff_delay(retry_num))
+        else:
+            limiter.on_success()
+            if instrumentation_hooks:
+                record_call(method, time.monotonic() - start, size(result) if size else 0, retry_num)
+            return result
+
+
+def execute_request(request, http=None, limiter=None, max_retries=DEFAULT_MAX_RETRIES):
+    """Execute googleapiclient request through rate limiter with backoff
+
+    Args:
+        request (HttpRequest): prepared API request
+        http (httplib2.Http): HTTP handle used instead of the request one
+
+    Returns:
+        (dict) API response
+    """
+    size = None
+
+    if instrumentation_hooks:
+        # response body length is known only to response post-processing
+        received = []
+        postproc = request.postproc
+
+        def counting_postproc(resp, content):
+            received.append(len(content or b''))
+            return postproc(resp, content)
+
+        request.postproc = counting_postproc
+        sent = len(request.body or b'')
+        size = lambda result: sent + sum(received)  # noqa: E731
+
+    return call_with_backoff(
+        lambda: request.execute(http=http), limiter=limiter, max_retries=max_retries,
+        method=request_method(request), size=size
+    )
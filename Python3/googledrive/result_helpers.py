@@ -1,9 +1,24 @@
+import contextlib
+import functools
+import hashlib
 import io
+import json
+import os
+import queue
 import re
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import DEFAULT_CHUNK_SIZE, MediaDownloadProgress, MediaIoBaseDownload, MediaFileUpload, \
+    MediaUploadProgress
 
-from constants import DEFAULT_FIELDS, MimeType
+from constants import DEFAULT_CHANGE_FIELDS, DEFAULT_DOWNLOAD_CHUNK_SIZE, DEFAULT_DOWNLOAD_PART_SIZE, DEFAULT_FIELDS, \
+    DEFAULT_TRANSFER_WORKERS, DEFAULT_UPLOAD_CHUNK_SIZE, MAX_PAGE_SIZE, MimeType
+from exceptions import ArgumentNotFoundGAPIException
+from rate_limit import call_with_backoff, execute_request
 
 
 class GoogleDriveResult:
@@ -14,9 +29,13 @@ class GoogleDriveResult:
         selected_fields (str): comma separated field names
 
     Info:
-        contains properties extracted from API response dict
+        contains properties extracted from API response dict;
+        instances are created from compact __slots__ subclasses generated once per fields set,
+        see result_class_factory()
     """
 
+    __slots__ = ()
+
     rename_attrs = {
         'mimeType': 'mime_type'
     }
@@ -27,96 +46,412 @@ class GoogleDriveResult:
     _size_type = int
     _parents_default = []
     _parents_type = list
+    _shortcutDetails_default = {}
+    _shortcutDetails_type = dict
+
+    def __new__(cls, result_dict=None, selected_fields=DEFAULT_FIELDS):
+        if cls is GoogleDriveResult:
+            cls = result_class_factory(parse_fields(selected_fields))
+        return super().__new__(cls)
+
+    @classmethod
+    def for_fields(cls, selected_fields=DEFAULT_FIELDS):
+        """Handles getting result class for comma separated field names
+
+        Returns:
+            (type) GoogleDriveResult subclass
+        """
+
+        return result_class_factory(parse_fields(selected_fields))
 
-    def __init__(self, result_dict, selected_fields=DEFAULT_FIELDS):
-        for field in selected_fields.split(','):
-            field = field.strip()
+    def values_list(self, *fields):
+        """Handles extracting field values
 
-            default_value = getattr(self, '_{}_default'.format(field), self._default)
-            default_type = getattr(self, '_{}_type'.format(field), self._type)
+        Args:
+            fields (str): field names, default: all fields of the result
 
-            new_field_name = self.rename_attrs.get(field, field)
-            setattr(self, new_field_name, default_type(result_dict.get(field, default_value)))
+        Returns:
+            (tuple) field values in given order
+        """
+
+        return tuple(getattr(self, result_attr(field)) for field in fields or self.fields)
+
+    def __reduce__(self):
+        # generated classes are not module attributes, so they are pickled as fields and slot values
+        return _restore_result, (self.fields, self.values_list())
 
     def __str__(self):
-        return 'ID: {}'.format(getattr(self, 'id'))
+        return 'ID: {}'.format(getattr(self, 'id', None))
 
     def __repr__(self):
         return '<ID: {} name: {} content type: {}>'.format(
-            getattr(self, 'id'), getattr(self, 'name'), getattr(self, 'mime_type')
+            getattr(self, 'id', None), getattr(self, 'name', None), getattr(self, 'mime_type', None)
         )
 
 
+@functools.lru_cache(maxsize=None)
+def parse_fields(selected_fields):
+    """Handles parsing comma separated field names
+
+    Args:
+        selected_fields (str): comma separated field names, eg. 'id, name'
+
+    Returns:
+        (tuple) unique field names in declaration order
+    """
+
+    fields = []
+    for field in selected_fields.split(','):
+        field = field.strip()
+        if field and field not in fields:
+            fields.append(field)
+    return tuple(fields)
+
+
+def result_attr(field):
+    """Handles mapping API field name to GoogleDriveResult attribute name, eg. 'mimeType' -> 'mime_type'"""
+    return re.sub(r'\W', '_', GoogleDriveResult.rename_attrs.get(field, field))
+
+
+def _field_converter(field):
+    return (
+        getattr(GoogleDriveResult, '_{}_type'.format(field), GoogleDriveResult._type),
+        getattr(GoogleDriveResult, '_{}_default'.format(field), GoogleDriveResult._default)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def result_class_factory(fields):
+    """Handles creation of GoogleDriveResult subclass for given fields
+
+    Args:
+        fields (tuple): field names, eg. ('id', 'name')
+
+    Returns:
+        (type) GoogleDriveResult subclass with __slots__ and generated constructor
+
+    Example:
+        result_class = result_class_factory(('id', 'name'))
+        result = result_class({'id': '123', 'name': 'test'})
+    """
+
+    attrs = []
+    namespace = {}
+    lines = ['def __init__(self, result_dict, selected_fields=None):', '    get = result_dict.get']
+
+    for index, field in enumerate(fields):
+        attr = result_attr(field)
+        attrs.append(attr)
+
+        namespace['_type_{}'.format(index)], namespace['_default_{}'.format(index)] = _field_converter(field)
+        lines.append('    self.{} = _type_{}(get({!r}, _default_{}))'.format(attr, index, field, index))
+
+    exec('\n'.join(lines), namespace)
+
+    return type('GoogleDriveResult', (GoogleDriveResult,), {
+        '__slots__': tuple(attrs),
+        '__init__': namespace['__init__'],
+        'fields': fields,
+    })
+
+
+def _restore_result(fields, values):
+    """Handles unpickling GoogleDriveResult, see GoogleDriveResult.__reduce__"""
+    result_class = result_class_factory(fields)
+    result = object.__new__(result_class)
+    for attr, value in zip(result_class.__slots__, values):
+        setattr(result, attr, value)
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def values_factory(fields, flat=False):
+    """Handles creation of API response dict to values tuple converter
+
+    Args:
+        fields (tuple): field names, eg. ('id', 'name')
+        flat (bool): return single value instead of one-element tuple
+
+    Returns:
+        (function) converter, values are typed the same way as GoogleDriveResult attributes
+
+    Example:
+        to_values = values_factory(('id', 'size'))
+        to_values({'id': '123', 'size': '42'})  # ('123', 42)
+    """
+
+    namespace = {}
+    values = []
+
+    for index, field in enumerate(fields):
+        namespace['_type_{}'.format(index)], namespace['_default_{}'.format(index)] = _field_converter(field)
+        values.append('_type_{}(get({!r}, _default_{}))'.format(index, field, index))
+
+    exec('\n'.join([
+        'def to_values(result_dict):',
+        '    get = result_dict.get',
+        '    return {}'.format(values[0] if flat else '({},)'.format(', '.join(values)))
+    ]), namespace)
+
+    return namespace['to_values']
+
+
+class GoogleDrivePagePrefetcher(threading.Thread):
+    """Background pages reader
+
+    Args:
+        fetch_page (callable): function returning (files list, next page token) for given page token
+        depth (int): max number of pages fetched ahead of the consumer
+        context (callable): returns context manager wrapping the whole run, eg. GoogleDriveServices.lease
+
+    Info:
+        fetches page N+1 while page N is consumed; blocks when `depth` pages are waiting
+
+    Example:
+        prefetcher = GoogleDrivePagePrefetcher(itit._fetch_page, depth=2)
+        prefetcher.start()
+        files = prefetcher.get_page()
+    """
+
+    _end_marker = object()
+    _put_timeout = 0.5
+
+    def __init__(self, fetch_page, depth=1, context=None):
+        super().__init__(daemon=True)
+        self.fetch_page = fetch_page
+        self.context = context or contextlib.nullcontext
+        self.pages = queue.Queue(maxsize=max(depth, 1))
+        self._stop_event = threading.Event()
+
+    def run(self):
+        token = None
+        try:
+            with self.context():
+                while not self._stop_event.is_set():
+                    files, token = self.fetch_page(token)
+                    self._put((files, None))
+
+                    if not token:
+                        break
+        except Exception as err:
+            self._put((None, err))
+        finally:
+            self._put(self._end_marker)
+
+    def _put(self, item):
+        # do not block forever when consumer has gone away
+        while not self._stop_event.is_set():
+            try:
+                self.pages.put(item, timeout=self._put_timeout)
+                return
+            except queue.Full:
+                continue
+
+    def get_page(self):
+        """Handles waiting for next fetched page
+
+        Returns:
+            (list) raw files dicts or None when there are no more pages
+        """
+
+        item = self.pages.get()
+        if item is self._end_marker:
+            # keep marker for subsequent calls
+            self._put(item)
+            return None
+
+        files, err = item
+        if err is not None:
+            raise err
+        return files
+
+    def stop(self):
+        self._stop_event.set()
+
+
 class GoogleDriveListIterator:
     """API results iterator
 
     Args:
-        drive_handler (build): Google API connection handler
+        drive_handler (build): Google API connection handler or callable returning handler of the current thread,
+            eg. GoogleDriveAPI.service_factory
         query_params (dict): connection params
+        prefetch (int): number of pages read ahead in a background thread; 0 disables read-ahead
+        http (httplib2.Http): HTTP handle used instead of the drive_handler one, eg. in a worker thread
+        element_filter (callable): client-side filter of API response dicts, for conditions not supported by API
 
     Returns:
         itself
 
     Info:
-        pass
+        with prefetch enabled drive_handler is used from a background thread, so do not share it with other calls
+        until iteration is finished or close() is called; handler callable is resolved in the thread fetching page
 
     Example:
         # init iterator:
         itit = GoogleDriveListIterator(drive_handler, params)
 
+        # init iterator with read-ahead of two pages:
+        itit = GoogleDriveListIterator(drive_handler, params, prefetch=2)
+
         # iterate over elements
         for elem in itit:
             pass
 
-        # access arbitrary elem by index
+        # stream elements without keeping them in cache
+        for elem in itit.iterator(cache=False):
+            pass
+
+        # access arbitrary elem by index; fetches only pages needed to reach the index
         itit[0]
+        itit[:10]
 
         # count elements
         itit.count()
         len(itit)
+
+        # (id, name) tuples instead of GoogleDriveResult instances
+        itit.values_list('id', 'name')
     """
 
-    def __init__(self, drive_handler, query_params):
+    def __init__(self, drive_handler, query_params, prefetch=0, http=None, element_filter=None):
         # helper attributes
-        self.token = None
+        self.list_to_consume = deque()
         self._all_elements_cache = []
         self._all_data_completed = False
+        self._pages = None
 
         # get arguments
         self.drive_handler = drive_handler
         self.base_query_params = query_params
+        self.prefetch = prefetch
+        self.http = http
+        self.element_filter = element_filter
 
         # extract fields info
         self.selected_fields = re.match('files\(([a-zA-Z,].*)\)', self.base_query_params.get('fields')).group(1)
+        self.result_class = GoogleDriveResult.for_fields(self.selected_fields)
 
-    def _build_response_data(self, first_run=False):
+    def _fetch_page(self, token=None, first_page_size=None):
+        """Handles single API page request
+
+        Args:
+            token (str): page token, None for the first page
+            first_page_size (int): pageSize hint used for the first page only
+
+        Returns:
+            (tuple) raw files dicts list and next page token
+        """
+
+        query_params = dict(self.base_query_params)
+        query_params.pop('pageToken', None)  # clear page token
+
+        if token:
+            query_params['pageToken'] = token
+        elif first_page_size and 'pageSize' not in query_params:
+            query_params['pageSize'] = min(first_page_size, MAX_PAGE_SIZE)
+
+        drive_handler = self.drive_handler() if callable(self.drive_handler) else self.drive_handler
+        resp = execute_request(drive_handler.files().list(**query_params), http=self.http)
+
+        files = resp.get('files', [])
+        if self.element_filter is not None:
+            files = [elem for elem in files if self.element_filter(elem)]
+        return files, resp.get('nextPageToken', None)
+
+    def iter_pages(self, first_page_size=None, prefetch=None):
+        """Handles pages generation
+
+        Args:
+            first_page_size (int): pageSize hint for the first page, eg. when only first elements are needed
+            prefetch (int): read-ahead depth, default: iterator prefetch; 0 fetches pages only when consumed
+
+        Returns:
+            (generator) raw files dicts lists, one per API page
+        """
+
+        fetch_page = functools.partial(self._fetch_page, first_page_size=first_page_size)
+        prefetch = self.prefetch if prefetch is None else prefetch
+
+        if prefetch:
+            # prefetch thread borrows idle service instead of building new one
+            prefetcher = GoogleDrivePagePrefetcher(
+                fetch_page, depth=prefetch, context=getattr(self.drive_handler, 'lease', None)
+            )
+            prefetcher.start()
+
+            try:
+                files = prefetcher.get_page()
+                while files is not None:
+                    yield files
+                    files = prefetcher.get_page()
+            finally:
+                prefetcher.stop()
+        else:
+            token = None
+            while True:
+                files, token = fetch_page(token)
+                yield files
+
+                if not token:
+                    return
+
+    def _build_response_data(self, first_run=False, page_size=None, prefetch=None):
         """ Handles consuming API date through requests
 
         Args:
             first_run (bool): whether call at init level or not
+            page_size (int): pageSize hint for the first page
+            prefetch (int): read-ahead depth, default: iterator prefetch
         """
 
-        query_params = self.base_query_params
-        query_params.pop('pageToken', None)  # clear page token
+        if first_run:
+            self.close()
+            self._all_elements_cache = []
+            self.list_to_consume = deque()
+            self._pages = self.iter_pages(first_page_size=page_size, prefetch=prefetch)
 
-        # check token when iterate over pages
-        if not first_run:
-            if not self.token:
-                return
+        files = None
+        if self._pages is not None:
+            # skip empty pages; API may return them together with next page token
+            files = next((page for page in self._pages if page), None)
 
-            query_params['pageToken'] = self.token
+        if files is None:
+            self._all_data_completed = True
+            self.close()
+            return
 
-        # call selected page
-        resp = self.drive_handler.files().list(**query_params).execute()
         # prepare part of results
-        self.list_to_consume = [GoogleDriveResult(elem, self.selected_fields) for elem in resp.get('files', [])]
+        results = [self.result_class(elem) for elem in files]
+        self.list_to_consume.extend(results)
         # update cache
-        self._all_elements_cache.extend(self.list_to_consume)
-        # catch new token
-        self.token = resp.get('nextPageToken', None)
+        self._all_elements_cache.extend(results)
+
+    def _fill_cache(self, count=None, page_size=None):
+        """Handles fetching pages until cache contains enough elements
+
+        Args:
+            count (int): required elements count; None means all elements
+            page_size (int): pageSize hint for the first page
+        """
+
+        # indexing needs only pages up to count, so they are not read ahead
+        prefetch = None if count is None else 0
+
+        while not self._all_data_completed and (count is None or len(self._all_elements_cache) < count):
+            self._build_response_data(first_run=self._pages is None, page_size=page_size, prefetch=prefetch)
 
     def __getitem__(self, index):
-        self._consume_iterator()
+        if isinstance(index, slice):
+            if index.stop is None or index.stop < 0 or (index.start or 0) < 0:
+                self._consume_iterator()
+            else:
+                self._fill_cache(index.stop, page_size=index.stop)
+        elif index < 0:
+            self._consume_iterator()
+        else:
+            self._fill_cache(index + 1, page_size=index + 1)
+
         return self._all_elements_cache[index]
 
     def __len__(self):
@@ -136,12 +471,14 @@ class GoogleDriveListIterator:
             itself
         """
 
-        # reset iterator state
         if self._all_data_completed:
             return iter(self._all_elements_cache)
 
-        self.token = None
-        self._build_response_data(first_run=True)
+        if self._pages is None:
+            self._build_response_data(first_run=True)
+        else:
+            # restart over already fetched elements and continue with next pages
+            self.list_to_consume = deque(self._all_elements_cache)
 
         return self
 
@@ -152,27 +489,75 @@ class GoogleDriveListIterator:
             (GoogleDriveResult) result object
         """
 
+        if not self.list_to_consume:
+            self._build_response_data()
+
         if self.list_to_consume:
             return self._get_next_elem()
-        else:
-            self._build_response_data()
 
-            if self.list_to_consume:
-                return self._get_next_elem()
-            else:
-                self._all_data_completed = True
-                raise StopIteration
+        raise StopIteration
 
     def _get_next_elem(self):
-        return self.list_to_consume.pop(0)
+        return self.list_to_consume.popleft()
 
     def _consume_iterator(self):
         """Handles simple iterator consumption
         """
 
-        if not self._all_data_completed:
-            for _ in self:
-                pass
+        self._fill_cache()
+
+    def iterator(self, cache=False):
+        """Handles streaming iteration over elements
+
+        Args:
+            cache (bool): whether keep elements in cache, as regular iteration does
+
+        Returns:
+            (iterator) result objects
+
+        Info:
+            with cache=False only the current page is kept in memory; inspired by the Django queryset method
+        """
+
+        if cache or self._all_data_completed:
+            return iter(self)
+
+        return self._stream_elements()
+
+    def _stream_elements(self):
+        for files in self.iter_pages():
+            page = deque(files)
+            while page:
+                yield self.result_class(page.popleft())
+
+    def values_list(self, *fields, flat=False):
+        """Handles returning values tuples instead of GoogleDriveResult instances
+
+        Args:
+            fields (str): field names, default: all selected fields
+            flat (bool): return single values instead of one-element tuples; valid with single field only
+
+        Returns:
+            itself
+
+        Info:
+            should be called before iteration starts; elements already cached are not converted
+        """
+
+        fields = fields or parse_fields(self.selected_fields)
+        if flat and len(fields) != 1:
+            raise ArgumentNotFoundGAPIException("'flat' is valid only with single field")
+
+        self.result_class = values_factory(tuple(fields), flat)
+        return self
+
+    def close(self):
+        """Handles stopping pages generation, including background pages reader
+        """
+
+        if self._pages is not None:
+            self._pages.close()
+            self._pages = None
 
     def count(self):
         """Handles count elements
@@ -185,22 +570,129 @@ class GoogleDriveListIterator:
         return len(self._all_elements_cache)
 
 
+class GoogleDriveChildrenIterator:
+    """Children of many parents iterator
+
+    Args:
+        iterators (list): (parent IDs tuple, GoogleDriveListIterator) pairs, one per OR query
+
+    Returns:
+        (parent ID, GoogleDriveResult) pairs; entry placed in many listed parents is returned once per parent
+
+    Example:
+        children = gapi.get_gfiles_children_by_id(['someId', 'otherId'])
+
+        for parent_id, elem in children:
+            pass
+
+        # children lists by parent ID
+        children.group()
+    """
+
+    def __init__(self, iterators):
+        self.iterators = iterators
+
+    def __iter__(self):
+        for parent_ids, iterator in self.iterators:
+            for elem in iterator.iterator(cache=False):
+                for parent_id in elem.parents:
+                    if parent_id in parent_ids:
+                        yield parent_id, elem
+
+    def group(self):
+        """Handles grouping children by parents
+
+        Returns:
+            (dict) parent ID -> GoogleDriveResult list, with key for every listed parent
+        """
+
+        grouped = {parent_id: [] for parent_ids, _ in self.iterators for parent_id in parent_ids}
+        for parent_id, elem in self:
+            grouped[parent_id].append(elem)
+        return grouped
+
+
+class GoogleDriveChangesIterator:
+    """Changes feed iterator
+
+    Args:
+        drive_handler (build): Google API connection handler
+        page_token (str): page token to start from, eg. result of get_start_page_token()
+        fields (str): comma separated change field names
+        http (httplib2.Http): HTTP handle used instead of the drive_handler one
+
+    Attributes:
+        next_page_token (str): page token following the last yielded page, None after the last page
+        new_start_page_token (str): page token for the next check, set when all changes are consumed
+
+    Example:
+        token = GoogleDriveChangesIterator.get_start_page_token(drive_handler)
+        # ... later
+        changes = GoogleDriveChangesIterator(drive_handler, token)
+        for change in changes:
+            print(change['fileId'])
+        token = changes.new_start_page_token
+    """
+
+    def __init__(self, drive_handler, page_token, fields=DEFAULT_CHANGE_FIELDS, http=None):
+        self.drive_handler = drive_handler
+        self.page_token = page_token
+        self.fields = fields
+        self.http = http
+        self.next_page_token = None
+        self.new_start_page_token = None
+
+    @staticmethod
+    def get_start_page_token(drive_handler, http=None):
+        return execute_request(drive_handler.changes().getStartPageToken(), http=http).get('startPageToken')
+
+    def iter_pages(self):
+        """Handles pages generation
+
+        Returns:
+            (generator) raw change dicts lists, one per API page
+        """
+
+        token = self.page_token
+        while token:
+            resp = execute_request(self.drive_handler.changes().list(
+                pageToken=token,
+                pageSize=MAX_PAGE_SIZE,
+                fields='nextPageToken, newStartPageToken, changes({})'.format(self.fields)
+            ), http=self.http)
+
+            token = self.next_page_token = resp.get('nextPageToken')
+            if 'newStartPageToken' in resp:
+                self.new_start_page_token = resp['newStartPageToken']
+
+            yield resp.get('changes', [])
+
+    def __iter__(self):
+        for changes in self.iter_pages():
+            yield from changes
+
+
 class GoogleDriveFileDownloader:
     """GDrive file downloader
 
     Args:
         request - Google Api Client request to handle file download stream
         file_handler - any stream object handler, eg. BytesIO
+        http - HTTP handle used instead of the request one, eg. when downloading in a worker thread
+        chunk_size - bytes requested in single call
 
     Example:
         gdownloader = GoogleDriveFileDownloader(self.gapi_instance.file_media_handler(file_id))
         gdownloader.download()
     """
 
-    def __init__(self, request, file_handler=None):
+    def __init__(self, request, file_handler=None, http=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        if http is not None:
+            request.http = http
+
         self.done = False
         self.file_handler = file_handler or io.BytesIO()
-        self.downloader = MediaIoBaseDownload(self.file_handler, request)
+        self.downloader = MediaIoBaseDownload(self.file_handler, request, chunksize=chunk_size)
         self.current_status = 0
 
     def __iter__(self):
@@ -210,7 +702,11 @@ class GoogleDriveFileDownloader:
         if self.done:
             raise StopIteration
         else:
-            current_status, self.done = self.downloader.next_chunk()
+            progress = self.downloader._progress
+            current_status, self.done = call_with_backoff(
+                self.downloader.next_chunk, method='drive.files.get_media',
+                size=lambda result: result[0].resumable_progress - progress
+            )
             return current_status
 
     def download(self, show_progress=False):
@@ -232,9 +728,233 @@ class GoogleDriveFileDownloader:
                 pass
 
 
+class GoogleDriveRangedDownloader:
+    """GDrive file parallel downloader
+
+    Args:
+        request - Google Api Client request to handle file download stream
+        path (str): local file path
+        size (int): file size in bytes
+        http_factory (callable): returns HTTP handle of the current thread, eg. lambda: gapi.thread_http
+        part_size (int): size of single byte range
+        max_workers (int): number of worker threads
+
+    Info:
+        file is preallocated and split into byte ranges fetched concurrently with HTTP Range requests,
+        every range is written in place with os.pwrite(); failed ranges are retried with backoff,
+        file is removed when download fails
+
+    Example:
+        gdownloader = GoogleDriveRangedDownloader(
+            gapi.file_media_handler(file_id), '/tmp/big.bin', size, lambda: gapi.thread_http
+        )
+        gdownloader.download()
+    """
+
+    def __init__(self, request, path, size, http_factory, part_size=DEFAULT_DOWNLOAD_PART_SIZE,
+                 max_workers=DEFAULT_TRANSFER_WORKERS):
+        self.request = request
+        self.path = path
+        self.size = int(size)
+        self.http_factory = http_factory
+        self.part_size = part_size
+        self.max_workers = max_workers
+
+        self.done = False
+        self.downloaded = 0
+
+    def _ranges(self):
+        return [(start, min(start + self.part_size, self.size) - 1) for start in range(0, self.size, self.part_size)]
+
+    def _fetch_range(self, fd, start, end):
+        headers = dict(self.request.headers or {})
+        headers['range'] = 'bytes={}-{}'.format(start, end)
+
+        def fetch():
+            resp, content = self.http_factory().request(self.request.uri, method='GET', headers=headers)
+            if resp.status >= 300:
+                raise HttpError(resp, content, uri=self.request.uri)
+            if len(content) != end - start + 1:
+                raise IOError('Range {}-{} of {} returned {} bytes'.format(start, end, self.path, len(content)))
+            return content
+
+        content = call_with_backoff(fetch, method='drive.files.get_media', size=len)
+
+        view = memoryview(content)
+        offset = start
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+        return len(content)
+
+    def __iter__(self):
+        """Download process evaluation, yields progress after every finished range
+
+        Returns:
+            (generator) MediaDownloadProgress instances
+        """
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, self.size)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self._fetch_range, fd, start, end) for start, end in self._ranges()]
+                try:
+                    for future in as_completed(futures):
+                        self.downloaded += future.result()
+                        yield MediaDownloadProgress(self.downloaded, self.size)
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+            self.done = True
+        finally:
+            os.close(fd)
+
+            # do not leave preallocated, partially downloaded file
+            if not self.done and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def download(self, show_progress=False):
+        """Download process evaluation
+
+        Args:
+             show_progress (bool): flag for enable progress printing
+
+        Returns:
+            None
+        """
+        if show_progress:
+            # extract status info
+            for current_status in self:
+                print('Download {}%'.format(current_status.progress()))
+        else:
+            # just consume download process
+            for elem in self:
+                pass
+
+
+class _ChunkSink:
+    """Download target keeping reference to the last written chunk instead of copying it
+    """
+
+    def __init__(self):
+        self.chunk = b''
+
+    def write(self, data):
+        self.chunk = data
+        return len(data)
+
+
+class GoogleDriveFileStreamer(GoogleDriveFileDownloader):
+    """GDrive file streaming downloader
+
+    Args:
+        request - Google Api Client request to handle file download stream
+        chunk_size - bytes requested in single call; only one chunk is kept in memory
+        http - HTTP handle used instead of the request one
+
+    Info:
+        chunks are handed over as memoryview of the received response body, without intermediate buffer;
+        as_reader() exposes the stream as file-like object (readinto() fills caller-provided buffer)
+
+    Example:
+        md5 = hashlib.md5()
+        for chunk in gapi.files.get_streamer(file_id).iter_chunks():
+            md5.update(chunk)
+
+        # pipe into clamscan reading from stdin
+        proc = subprocess.Popen(['clamscan', '-'], stdin=subprocess.PIPE)
+        for chunk in gapi.files.get_streamer(file_id).iter_chunks():
+            proc.stdin.write(chunk)
+
+        # S3 upload from file-like object
+        s3_client.upload_fileobj(gapi.files.get_streamer(file_id).as_reader(), bucket_name, key)
+    """
+
+    def __init__(self, request, chunk_size=DEFAULT_DOWNLOAD_CHUNK_SIZE, http=None):
+        super().__init__(request, file_handler=_ChunkSink(), http=http, chunk_size=chunk_size)
+
+    def iter_chunks(self):
+        """Handles chunks download
+
+        Returns:
+            (generator) memoryview of every downloaded chunk
+        """
+        for _ in self:
+            yield memoryview(self.file_handler.chunk)
+
+    def as_reader(self):
+        """Handles file-like access to the stream
+
+        Returns:
+            (io.RawIOBase) readable stream
+        """
+        return GoogleDriveStreamReader(self.iter_chunks())
+
+
+class GoogleDriveStreamReader(io.RawIOBase):
+    """Readable raw stream over memoryview chunks
+
+    Args:
+        chunks (iter): memoryview/bytes chunks, eg. GoogleDriveFileStreamer.iter_chunks()
+    """
+
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = chunks
+        self.current = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.current:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.current = memoryview(chunk)
+
+        size = min(len(buffer), len(self.current))
+        buffer[:size] = self.current[:size]
+        self.current = self.current[size:]
+        return size
+
+
 class GoogleDriveFileUploader:
+    """GDrive file uploader
+
+    Args:
+        file_name (str): name of created GDrive file
+        full_path (str): path to local file
+        parent_folder_id (str): GDrive folder ID
+        resumable (bool): upload file in chunks through resumable upload session
+        chunk_size (int): chunk size in bytes for resumable upload; must be multiple of 256 KB
+        session_file (str): path where resumable session URI is kept, default: full_path + SESSION_FILE_SUFFIX,
+            or file in temp directory when local file directory is not writable
+
+    Info:
+        resumable session URI is persisted after every chunk, so upload interrupted even by process restart
+        continues from the last acknowledged byte; session is reused only for the same local file (path, size,
+        mtime) and metadata (name, parents, mimeType); session file is removed when upload is finished
 
-    def __init__(self, file_name, full_path, parent_folder_id=None):
+    Example:
+        guploader = GoogleDriveFileUploader('name', '/path/to/file')
+        file_id = guploader.upload(drive_handler)
+
+        # resumable upload with progress
+        guploader = GoogleDriveFileUploader('name', '/path/to/file', resumable=True, chunk_size=8 * 1024 * 1024)
+        for current_status in guploader.bind(drive_handler):
+            print('Upload {}%'.format(current_status.progress()))
+        guploader.file_id
+    """
+
+    SESSION_FILE_SUFFIX = '.gdupload'
+
+    def __init__(self, file_name, full_path, parent_folder_id=None, resumable=False,
+                 chunk_size=DEFAULT_UPLOAD_CHUNK_SIZE, session_file=None):
         mime_type = MimeType.BINARY_MIME_TYPE
         # set metadata
         self.file_meta = {
@@ -247,20 +967,179 @@ class GoogleDriveFileUploader:
 
         self.full_path = full_path
         self.mime_type = mime_type
+        self.resumable = resumable
+        self.chunk_size = chunk_size
+        self.session_file = session_file or self._default_session_file(full_path)
+        self._session_file_given = session_file is not None
+
+        self.done = False
+        self.file_id = None
+        self._sent = 0
+        self.media = None
+        self.request = None
+
+    def bind(self, drive_handler):
+        """Handles upload request preparation
 
-    def upload(self, drive_handler):
+        Args:
+            drive_handler (build): Google API connection handler
+
+        Returns:
+            itself, ready for iteration over upload progress
+        """
         # init media data
-        media = MediaFileUpload(self.full_path, mimetype=self.mime_type)
+        self.media = MediaFileUpload(
+            self.full_path, mimetype=self.mime_type, chunksize=self.chunk_size, resumable=self.resumable
+        )
 
         # create file api call
-        file = drive_handler.files().create(
+        self.request = drive_handler.files().create(
             body=self.file_meta,
-            media_body=media,
+            media_body=self.media,
             fields='id'  # for return purpose
-        ).execute()
+        )
+        self.done = False
+        self.file_id = None
+        self._sent = 0
+
+        if self.resumable:
+            self._restore_session()
+
+        return self
+
+    @classmethod
+    def _temp_session_file(cls, full_path):
+        path_hash = hashlib.sha1(os.path.abspath(full_path).encode('utf-8')).hexdigest()
+        return os.path.join(tempfile.gettempdir(), 'googledrive-{}{}'.format(path_hash, cls.SESSION_FILE_SUFFIX))
+
+    @classmethod
+    def _default_session_file(cls, full_path):
+        if os.access(os.path.dirname(os.path.abspath(full_path)), os.W_OK):
+            return full_path + cls.SESSION_FILE_SUFFIX
+        # read-only source directory
+        return cls._temp_session_file(full_path)
+
+    def _session_key(self):
+        stat = os.stat(self.full_path)
+        return {
+            'path': os.path.abspath(self.full_path), 'size': stat.st_size, 'mtime': stat.st_mtime,
+            # name and parents are fixed by Drive when session is started
+            'meta': self.file_meta
+        }
+
+    def _restore_session(self):
+        temp_session_file = self._temp_session_file(self.full_path)
+        if not self._session_file_given and not os.path.exists(self.session_file) \
+                and os.path.exists(temp_session_file):
+            # session saved after writing next to local file failed
+            self.session_file = temp_session_file
+
+        try:
+            with open(self.session_file) as session_handler:
+                session = json.load(session_handler)
+        except (OSError, ValueError):
+            return
+
+        # local file or metadata changed since session was started
+        if session.get('key') != self._session_key():
+            self._remove_session()
+            return
+
+        self.request.resumable_uri = session['uri']
+        # error state makes next chunk call ask server for the last acknowledged byte first
+        self.request._in_error_state = True
+
+    def _save_session(self):
+        session = {'uri': self.request.resumable_uri, 'key': self._session_key()}
+        try:
+            with open(self.session_file, 'w') as session_handler:
+                json.dump(session, session_handler)
+        except PermissionError:
+            if self._session_file_given:
+                raise
+            self.session_file = self._temp_session_file(self.full_path)
+            with open(self.session_file, 'w') as session_handler:
+                json.dump(session, session_handler)
+
+    def _remove_session(self):
+        if os.path.exists(self.session_file):
+            os.remove(self.session_file)
+
+    def _chunk_size(self, result):
+        # bytes acknowledged by the last next_chunk() call
+        current_status, response = result
+        progress = self.media.size() if response is not None else current_status.resumable_progress
+        sent, self._sent = progress - self._sent, progress
+        return sent
+
+    def _finish(self, response):
+        self.done = True
+        self.file_id = response.get('id')
 
         # close file in case of python warning
         # googledrive/api.py:279: ResourceWarning: unclosed file
-        media._fd.close()
+        self.media._fd.close()
+
+        if self.resumable:
+            self._remove_session()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """Handles next chunk upload
+
+        Returns:
+            (MediaUploadProgress) upload progress
+        """
+        if self.done:
+            raise StopIteration
+
+        if self.request is None:
+            raise ArgumentNotFoundGAPIException('You should call bind() with drive handler before upload')
+
+        if not self.resumable:
+            self._finish(execute_request(self.request))
+            return MediaUploadProgress(self.media.size(), self.media.size())
+
+        resumable_uri = self.request.resumable_uri
+        try:
+            current_status, response = call_with_backoff(
+                self.request.next_chunk, method='drive.files.create', size=self._chunk_size
+            )
+        except HttpError as err:
+            if resumable_uri is None or err.resp.status not in (404, 410):
+                raise
+
+            # stored session expired; start new one from the first byte
+            self._remove_session()
+            self.request.resumable_uri = None
+            self.request.resumable_progress = 0
+            self._sent = 0
+            self.request._in_error_state = False
+            current_status, response = call_with_backoff(
+                self.request.next_chunk, method='drive.files.create', size=self._chunk_size
+            )
+
+        if response is not None:
+            self._finish(response)
+            return MediaUploadProgress(self.media.size(), self.media.size())
+
+        self._save_session()
+        return current_status
+
+    def upload(self, drive_handler, show_progress=False):
+        """Upload process evaluation
+
+        Args:
+            drive_handler (build): Google API connection handler
+            show_progress (bool): flag for enable progress printing
+
+        Returns:
+            (str) created file ID
+        """
+        for current_status in self.bind(drive_handler):
+            if show_progress:
+                print('Upload {}%'.format(current_status.progress()))
 
-        return file.get('id')
+        return self.file_id
@@ -0,0 +1,161 @@
+import contextlib
+import json
+import logging
+import threading
+
+try:
+    import google_auth_httplib2
+    from googleapiclient.discovery import DISCOVERY_URI, build_from_document
+    from googleapiclient.http import build_http
+except ImportError:
+    logging.error('You should install Google Api Client lib: pip install google-api-python-client==1.7.3')
+
+from exceptions import WrongInitGAPIException
+
+
+def authorized_http(credentials):
+    """New authorized HTTP handle
+
+    Args:
+        credentials (Credentials): oauth2client or google-auth credentials
+
+    Returns:
+        (httplib2.Http) authorized HTTP handle; handles share credentials, so token is refreshed once for all
+    """
+    if hasattr(credentials, 'authorize'):
+        # oauth2client credentials
+        return credentials.authorize(build_http())
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=build_http())
+
+
+class GoogleDriveServicePool:
+    """Process-wide source of Drive service objects
+
+    Args:
+        discovery_document (dict): parsed discovery document; fetched once on first use when not given
+        api_name (str): API name
+        api_version (str): API version
+
+    Info:
+        discovery document is downloaded and parsed once per pool and services are built from it
+        (build_from_document), each with its own authorized HTTP handle, because httplib2 is not thread-safe;
+        pool keeps no services, they are kept by GoogleDriveServices objects (one per GoogleDriveAPI instance)
+        and freed together with them
+
+    Example:
+        services = default_service_pool.services(credentials)
+        drive_handler = services()  # service of the current thread
+
+        # in worker threads
+        with ThreadPoolExecutor() as executor:
+            executor.map(lambda file_id: services().files().get(fileId=file_id), ids)
+    """
+
+    def __init__(self, discovery_document=None, api_name='drive', api_version='v3'):
+        self.api_name = api_name
+        self.api_version = api_version
+
+        self._discovery_document = discovery_document
+        self._lock = threading.Lock()
+
+    @property
+    def discovery_document(self):
+        if self._discovery_document is None:
+            with self._lock:
+                if self._discovery_document is None:
+                    self._discovery_document = self._fetch_discovery_document()
+        return self._discovery_document
+
+    def _fetch_discovery_document(self):
+        uri = DISCOVERY_URI.format(api=self.api_name, apiVersion=self.api_version)
+        resp, content = build_http().request(uri)
+
+        if resp.status >= 400:
+            raise WrongInitGAPIException('Discovery document download failed: {} {}'.format(resp.status, uri))
+        return json.loads(content.decode('utf-8'))
+
+    def build(self, credentials):
+        """Handles building new service
+
+        Args:
+            credentials (Credentials): oauth2client or google-auth credentials
+
+        Returns:
+            (Resource) Drive service with its own authorized HTTP handle
+        """
+        return build_from_document(self.discovery_document, http=authorized_http(credentials))
+
+    def services(self, credentials):
+        """Handles creating per-thread services of credentials, see GoogleDriveServices"""
+        return GoogleDriveServices(self, credentials)
+
+
+class GoogleDriveServices:
+    """Per-thread Drive services of single credentials
+
+    Args:
+        pool (GoogleDriveServicePool): pool building services
+        credentials (Credentials): oauth2client or google-auth credentials
+
+    Info:
+        calling object returns service of the current thread, created on first use;
+        services are kept in thread-local storage of this object, so they are freed together with it
+        (eg. with GoogleDriveAPI instance) or with their thread;
+        short-lived threads (eg. list prefetchers) should use lease(), which lends idle service kept after previous
+        lease instead of building new one and opening new TLS connection every time
+
+    Example:
+        services = default_service_pool.services(credentials)
+        services().files().list().execute()
+
+        # in short-lived thread
+        with services.lease():
+            services().files().list().execute()
+    """
+
+    # max number of idle leased services kept for next short-lived threads
+    max_idle = 4
+
+    def __init__(self, pool, credentials):
+        self.pool = pool
+        self.credentials = credentials
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self._thread_local = threading.local()
+
+    def __call__(self):
+        service = getattr(self._thread_local, 'service', None)
+        if service is None:
+            service = self._thread_local.service = self.pool.build(self.credentials)
+        return service
+
+    @contextlib.contextmanager
+    def lease(self):
+        """Handles lending idle service to the current thread until exit
+
+        Returns:
+            (Resource) Drive service, also returned by calling object in the current thread
+        """
+        with self._lock:
+            service = self._idle.pop() if self._idle else None
+
+        self._thread_local.service = service or self.pool.build(self.credentials)
+        try:
+            yield self._thread_local.service
+        finally:
+            service = self._thread_local.service
+            self._thread_local.service = None
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(service)
+
+    def clear(self):
+        """Handles dropping service of the current thread and idle services"""
+        self._thread_local.service = None
+        with self._lock:
+            self._idle = []
+
+
+# process-wide pool shared by all GoogleDriveAPI instances
+default_service_pool = GoogleDriveServicePool()
@@ -0,0 +1,173 @@
+import json
+import sqlite3
+
+from constants import DEFAULT_FIELDS, MAX_PAGE_SIZE
+from result_helpers import GoogleDriveChangesIterator, GoogleDriveListIterator, parse_fields
+
+
+class GoogleDriveSyncIndex:
+    """Local mirror index of GDrive entries
+
+    Args:
+        index_path (str): path to SQLite file, ':memory:' for in-memory index
+
+    Info:
+        keeps entries metadata (id -> API response dict), parent links and changes feed cursor
+
+    Example:
+        index = GoogleDriveSyncIndex('/path/to/index.db')
+        index.get('someId')
+        index.children('someFolderId')
+    """
+
+    def __init__(self, index_path):
+        self.db = sqlite3.connect(index_path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS entries (id TEXT PRIMARY KEY, data TEXT);
+            CREATE TABLE IF NOT EXISTS parents (id TEXT, parent_id TEXT, PRIMARY KEY (id, parent_id));
+            CREATE INDEX IF NOT EXISTS parents_parent_id ON parents (parent_id);
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+        ''')
+        self.db.commit()
+
+    @property
+    def page_token(self):
+        row = self.db.execute("SELECT value FROM state WHERE key = 'page_token'").fetchone()
+        return row[0] if row else None
+
+    def set_page_token(self, page_token):
+        self.db.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('page_token', ?)", (page_token,))
+
+    def upsert(self, data):
+        """Handles storing entry and its parent links
+
+        Args:
+            data (dict): API response dict, must contain 'id'
+        """
+        self.db.execute('INSERT OR REPLACE INTO entries (id, data) VALUES (?, ?)', (data['id'], json.dumps(data)))
+        self.db.execute('DELETE FROM parents WHERE id = ?', (data['id'],))
+        self.db.executemany(
+            'INSERT INTO parents (id, parent_id) VALUES (?, ?)',
+            [(data['id'], parent_id) for parent_id in data.get('parents', [])]
+        )
+
+    def remove(self, entry_id):
+        self.db.execute('DELETE FROM entries WHERE id = ?', (entry_id,))
+        self.db.execute('DELETE FROM parents WHERE id = ?', (entry_id,))
+
+    def clear(self):
+        self.db.execute('DELETE FROM entries')
+        self.db.execute('DELETE FROM parents')
+        self.db.execute('DELETE FROM state')
+
+    def commit(self):
+        self.db.commit()
+
+    def get(self, entry_id):
+        """Handles getting entry
+
+        Returns:
+            (dict) API response dict or None
+        """
+        row = self.db.execute('SELECT data FROM entries WHERE id = ?', (entry_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def children(self, parent_id):
+        """Handles getting children IDs
+
+        Returns:
+            (list) IDs of entries placed in parent
+        """
+        return [row[0] for row in self.db.execute('SELECT id FROM parents WHERE parent_id = ?', (parent_id,))]
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+
+class GoogleDriveChangesSync:
+    """Incremental delta sync of GDrive entries into local index
+
+    Args:
+        gapi_instance (GoogleDriveAPI): api instance
+        index (GoogleDriveSyncIndex): local mirror index
+        fields (str): comma separated field names kept in index
+
+    Info:
+        first run lists the whole drive and stores changes feed cursor taken before listing;
+        next runs consume only changes.list pages, committing every page together with cursor,
+        so interrupted sync continues from the last applied page
+
+    Example:
+        syncer = GoogleDriveChangesSync(gapi, GoogleDriveSyncIndex('/path/to/index.db'))
+        syncer.sync()  # full listing on first run
+        syncer.sync()  # only changes since previous run
+    """
+
+    def __init__(self, gapi_instance, index, fields=DEFAULT_FIELDS):
+        self.gapi_instance = gapi_instance
+        self.index = index
+
+        # id and parents are required to keep index structure
+        fields = parse_fields(fields)
+        self.fields = ', '.join(tuple(field for field in ('id', 'parents') if field not in fields) + fields)
+
+    def bootstrap(self):
+        """Handles full index rebuild
+
+        Returns:
+            (dict) sync stats
+        """
+        drive_handler = self.gapi_instance.drive_handler
+        # cursor is taken before listing, so changes made during listing are applied by next sync
+        page_token = GoogleDriveChangesIterator.get_start_page_token(drive_handler)
+
+        params = {
+            'q': 'trashed=false',
+            'pageSize': MAX_PAGE_SIZE,
+            'fields': 'files({}), nextPageToken'.format(self.fields)
+        }
+
+        self.index.clear()
+        updated = 0
+        for files in GoogleDriveListIterator(drive_handler, params).iter_pages():
+            for entry in files:
+                self.index.upsert(entry)
+            updated += len(files)
+
+        self.index.set_page_token(page_token)
+        self.index.commit()
+
+        return {'updated': updated, 'removed': 0, 'full': True}
+
+    def sync(self):
+        """Handles applying changes since the last run
+
+        Returns:
+            (dict) sync stats
+        """
+        if self.index.page_token is None:
+            return self.bootstrap()
+
+        updated = 0
+        removed = 0
+        file_fields = self.fields if 'trashed' in parse_fields(self.fields) else '{}, trashed'.format(self.fields)
+        changes = GoogleDriveChangesIterator(
+            self.gapi_instance.drive_handler, self.index.page_token,
+            fields='fileId, removed, file({})'.format(file_fields)
+        )
+
+        for page in changes.iter_pages():
+            for change in page:
+                entry = change.get('file')
+
+                if change.get('removed') or not entry or entry.get('trashed'):
+                    self.index.remove(change['fileId'])
+                    removed += 1
+                else:
+                    self.index.upsert(entry)
+                    updated += 1
+
+            self.index.set_page_token(changes.next_page_token or changes.new_start_page_token)
+            self.index.commit()
+
+        return {'updated': updated, 'removed': removed, 'full': False}
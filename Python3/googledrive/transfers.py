@@ -0,0 +1,141 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from constants import DEFAULT_TRANSFER_WORKERS
+from result_helpers import GoogleDriveFileDownloader
+
+logger = logging.getLogger(__name__)
+
+
+class GoogleDriveTransferStatus:
+    """Single file transfer status
+
+    Args:
+        file_id (str): GDrive entry ID
+        path (str): local file path
+
+    Attributes:
+        done (bool): whether transfer finished successfully
+        error (Exception): transfer error, if any
+        size (int): transferred bytes
+        elapsed (float): transfer time in seconds
+    """
+
+    def __init__(self, file_id, path):
+        self.file_id = file_id
+        self.path = path
+        self.done = False
+        self.error = None
+        self.size = 0
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return '<ID: {} path: {} done: {} size: {} error: {}>'.format(
+            self.file_id, self.path, self.done, self.size, self.error
+        )
+
+
+class GoogleDriveDownloadManager:
+    """Concurrent downloader for many GDrive files
+
+    Args:
+        gapi_instance (GoogleDriveAPI): api instance
+        max_workers (int): number of worker threads
+
+    Attributes:
+        statuses (list): GoogleDriveTransferStatus instances of the last run
+        elapsed (float): wall-clock time of the last run in seconds
+
+    Info:
+        every worker thread downloads with its own HTTP handle (see GoogleDriveAPI.thread_http)
+
+    Example:
+        manager = GoogleDriveDownloadManager(gapi, max_workers=8)
+        statuses = manager.download([('someId', '/tmp/a.bin'), ('otherId', '/tmp/b.bin')])
+        print(manager.summary())
+
+        # handle statuses as soon as files are ready
+        for status in manager.iter_download(targets):
+            print(status)
+    """
+
+    def __init__(self, gapi_instance, max_workers=DEFAULT_TRANSFER_WORKERS):
+        self.gapi_instance = gapi_instance
+        self.max_workers = max_workers
+        self.statuses = []
+        self.elapsed = 0.0
+
+    def _download_one(self, status):
+        start = time.monotonic()
+
+        try:
+            with open(status.path, 'wb') as file_handler:
+                downloader = GoogleDriveFileDownloader(
+                    self.gapi_instance.file_media_handler(status.file_id),
+                    file_handler=file_handler,
+                    http=self.gapi_instance.thread_http
+                )
+                downloader.download()
+                status.size = file_handler.tell()
+            status.done = True
+        except Exception as err:
+            logger.warning('Download of {} to {} failed: {}'.format(status.file_id, status.path, err))
+            status.error = err
+
+            # do not leave partially downloaded file
+            if os.path.exists(status.path):
+                os.remove(status.path)
+        finally:
+            status.elapsed = time.monotonic() - start
+
+        return status
+
+    def iter_download(self, targets):
+        """Download process evaluation, yields statuses in completion order
+
+        Args:
+            targets (iter): (file ID, local path) pairs
+
+        Returns:
+            (generator) GoogleDriveTransferStatus instances
+        """
+        self.statuses = [GoogleDriveTransferStatus(file_id, path) for file_id, path in targets]
+        start = time.monotonic()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self._download_one, status) for status in self.statuses]
+                for future in as_completed(futures):
+                    yield future.result()
+        finally:
+            self.elapsed = time.monotonic() - start
+
+    def download(self, targets):
+        """Download process evaluation
+
+        Args:
+            targets (iter): (file ID, local path) pairs
+
+        Returns:
+            (list) GoogleDriveTransferStatus instances in targets order
+        """
+        for _ in self.iter_download(targets):
+            pass
+        return self.statuses
+
+    @property
+    def total_size(self):
+        return sum(status.size for status in self.statuses)
+
+    @property
+    def throughput(self):
+        """Aggregate throughput of the last run in bytes per second"""
+        return self.total_size / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        done_count = sum(1 for status in self.statuses if status.done)
+        return 'Downloaded {}/{} files, {} B in {:.2f}s ({:.0f} B/s)'.format(
+            done_count, len(self.statuses), self.total_size, self.elapsed, self.throughput
+        )
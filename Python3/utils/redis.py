@@ -1,67 +1,448 @@
+import asyncio
+import atexit
+import functools
 import inspect
 import logging
+import os
+import random
+import threading
 import time
 
 import redis
+import redis.asyncio
+import redis.asyncio.retry
+from redis.backoff import NoBackoff
+from redis.retry import Retry
 
 REDIS_CONN_RETRY_MAX = 3
-REDIS_CONN_SLEEP_TIME = 5
+
+# retry policy: jittered exponential backoff (seconds) limited by total deadline
+REDIS_RETRY_BASE_DELAY = 0.1
+REDIS_RETRY_MAX_DELAY = 2
+REDIS_RETRY_DEADLINE = 10
+
+# circuit breaker: consecutive failed calls which open the circuit and seconds before next trial call
+REDIS_BREAKER_THRESHOLD = 5
+REDIS_BREAKER_RESET_TIME = 30
+
+# shared connection pools: max connections per pool and seconds to wait for free connection
+REDIS_POOL_MAX_CONNECTIONS = 50
+REDIS_POOL_TIMEOUT = 20
+
+# client methods which are not Redis commands (local objects, module clients, asyncio connection setup awaited by
+# every command), not decorated with retries
+REDIS_LOCAL_METHODS = frozenset([
+    'aclose', 'bf', 'cf', 'client', 'close', 'cms', 'ft', 'initialize', 'json', 'lock', 'monitor', 'pipeline',
+    'pubsub', 'tdigest', 'topk', 'ts', 'vset'
+])
+
+# bulk helpers and auto-flushing pipeline limits
+REDIS_BATCH_SIZE = 1000
+REDIS_PIPELINE_MAX_BYTES = 1024 * 1024
 
 logger = logging.getLogger(__name__)
 
 
-def redis_deco_wrapper_class_decorator(cls):
+class RedisCircuitOpenError(redis.exceptions.ConnectionError):
+    """raises when Redis is known to be down and call is rejected without connecting
+    """
+    pass
+
+
+class RedisCircuitBreaker:
+    """Circuit breaker state of single Redis server
+
+    Args:
+        failure_threshold (int): consecutive failed calls which open the circuit; None disables circuit breaker
+        reset_time (float): seconds after which open circuit lets single trial call through
+    """
+
+    def __init__(self, failure_threshold=REDIS_BREAKER_THRESHOLD, reset_time=REDIS_BREAKER_RESET_TIME):
+        self.failure_threshold = failure_threshold
+        self.reset_time = reset_time
+
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_time
+
+    def before_call(self):
+        """Handles rejecting calls while circuit is open
+
+        Raises:
+            RedisCircuitOpenError when circuit is open
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+
+            if time.monotonic() - self.opened_at < self.reset_time:
+                raise RedisCircuitOpenError('Redis circuit is open, call rejected')
+
+            # half-open: let this call through and keep others out until it finishes
+            self.opened_at = time.monotonic()
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failure_threshold is not None and self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error('Redis circuit opened after {} failed calls'.format(self.failures))
+                self.opened_at = time.monotonic()
+
+
+def _server_key(target):
+    """Handles getting (host, port, path, db) of Redis client, None for other objects"""
+    connection_pool = getattr(target, 'connection_pool', None)
+    connection_kwargs = getattr(connection_pool, 'connection_kwargs', None)
+    if connection_kwargs is None:
+        return None
+    return tuple(connection_kwargs.get(name) for name in ('host', 'port', 'path', 'db'))
+
+
+class RedisRetryPolicy:
+    """Redis calls retry policy with per server circuit breaker
+
+    Args:
+        max_retries (int): max number of retries of single call
+        base_delay (float): first retry max delay in seconds, doubled with every retry
+        max_delay (float): max delay between retries in seconds
+        deadline (float): max total time of single call with retries in seconds; None means no limit
+        failure_threshold (int): consecutive failed calls which open the circuit; None disables circuit breaker
+        reset_time (float): seconds after which open circuit lets single trial call through
+
+    Note:
+        delays are random in [0, min(max_delay, base_delay * 2 ** retry)] (full jitter), so clients do not retry
+        in lockstep; circuit is checked once per call and while it is open calls fail immediately with
+        RedisCircuitOpenError; every server (host, port, path, db of client connection pool) has its own circuit,
+        decorated functions which are not client methods share one; policy is thread-safe and may be shared
+        by sync and asyncio code
+
+    Example:
+        policy = RedisRetryPolicy(max_retries=5, deadline=3)
+
+        @redis_conn_retry_deco(policy=policy)
+        def get_value(key):
+            return fastcache.get(key)
+    """
+
+    retry_exceptions = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError,
+                        redis.exceptions.BusyLoadingError)
+
+    def __init__(self, max_retries=REDIS_CONN_RETRY_MAX, base_delay=REDIS_RETRY_BASE_DELAY,
+                 max_delay=REDIS_RETRY_MAX_DELAY, deadline=REDIS_RETRY_DEADLINE,
+                 failure_threshold=REDIS_BREAKER_THRESHOLD, reset_time=REDIS_BREAKER_RESET_TIME):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_time = reset_time
+
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, server_key=None):
+        """Handles getting circuit breaker of server
+
+        Args:
+            server_key (tuple): (host, port, path, db), None for calls not bound to client
+
+        Returns:
+            (RedisCircuitBreaker) breaker, created on first use
+        """
+        breaker = self._breakers.get(server_key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    server_key, RedisCircuitBreaker(self.failure_threshold, self.reset_time)
+                )
+        return breaker
+
+    def _call_breaker(self, func, args):
+        # bound methods carry client in __self__, decorated client methods get it as first argument
+        target = getattr(func, '__self__', None)
+        if target is None and args:
+            target = args[0]
+        return self.breaker(_server_key(target))
+
+    # ============================== retries ==============================
+
+    def delay(self, retry_num):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry_num))
+
+    def _next_delay(self, breaker, retry_num, start, err):
+        """Handles retry decision
+
+        Returns:
+            (float) seconds to sleep before retry
+
+        Raises:
+            err when call should not be retried
+        """
+        if isinstance(err, RedisCircuitOpenError):
+            # rejected by circuit of nested decorated call
+            raise err
+
+        delay = self.delay(retry_num)
+        out_of_time = self.deadline is not None and time.monotonic() - start + delay > self.deadline
+
+        if retry_num >= self.max_retries or out_of_time:
+            breaker.on_failure()
+            raise err
+
+        logger.warning('Redis connection error: {}. Going to sleep for {:.2f}s and retrying ({}/{})'.format(
+            err, delay, retry_num + 1, self.max_retries
+        ))
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        """Handles sync call with retries"""
+        breaker = self._call_breaker(func, args)
+        breaker.before_call()
+
+        start = time.monotonic()
+        retry_num = 0
+
+        while True:
+            try:
+                result = func(*args, **kwargs)
+            except self.retry_exceptions as err:
+                time.sleep(self._next_delay(breaker, retry_num, start, err))
+                retry_num += 1
+            else:
+                if asyncio.iscoroutine(result):
+                    # sync method of asyncio client returning coroutine, eg. redis.asyncio.Redis.get;
+                    # other awaitables (eg. asyncio pipeline) are returned as is
+                    return self._await_with_retries(breaker, result, func, args, kwargs, start)
+
+                breaker.on_success()
+                return result
+
+    async def _await_with_retries(self, breaker, awaitable, func, args, kwargs, start):
+        retry_num = 0
+
+        while True:
+            try:
+                result = await awaitable
+            except self.retry_exceptions as err:
+                await asyncio.sleep(self._next_delay(breaker, retry_num, start, err))
+                retry_num += 1
+                awaitable = func(*args, **kwargs)
+            else:
+                breaker.on_success()
+                return result
+
+    async def call_async(self, func, *args, **kwargs):
+        """Handles asyncio call with retries, sleeping without blocking event loop"""
+        breaker = self._call_breaker(func, args)
+        breaker.before_call()
+        return await self._await_with_retries(breaker, func(*args, **kwargs), func, args, kwargs, time.monotonic())
+
+
+# process-wide policy shared by decorated calls, circuit breakers are kept per server
+default_retry_policy = RedisRetryPolicy()
+
+
+def redis_deco_wrapper_class_decorator(cls=None, policy=None):
     """Redis connection class all methods decorator
 
+    Args:
+        policy (RedisRetryPolicy): retry policy, default: process-wide policy
+
+    Note:
+        methods with '_' in name and REDIS_LOCAL_METHODS, which do no network I/O, are not decorated
+
     Example:
-        redis_conn_retry_deco(method)
-        or
-        @redis_conn_retry_deco()
-        def some_method():
+        @redis_deco_wrapper_class_decorator
+        class SomeClass(redis.Redis):
+            pass
+
+        @redis_deco_wrapper_class_decorator(policy=RedisRetryPolicy(deadline=1))
+        class OtherClass(redis.Redis):
             pass
     """
 
+    if cls is None:
+        return functools.partial(redis_deco_wrapper_class_decorator, policy=policy)
+
     for name, method in inspect.getmembers(cls, inspect.isfunction):
-        if '_' not in name:
-            setattr(cls, name, redis_conn_retry_deco(method))
+        if '_' not in name and name not in REDIS_LOCAL_METHODS:
+            setattr(cls, name, redis_conn_retry_deco(method, policy=policy))
     return cls
 
 
-def redis_conn_retry_deco(func):
+def redis_conn_retry_deco(func=None, policy=None):
     """Redis connection retry decorator
 
-    Attributes:
-        deco_tries (int): keep retries count
-        sleep_time (int): time to sleep in seconds
+    Args:
+        func (callable): decorated function; coroutine functions are retried without blocking event loop
+        policy (RedisRetryPolicy): retry policy, default: process-wide policy
 
     Example:
+        redis_conn_retry_deco(method)
+        or
         @redis_conn_retry_deco
-        class SomeClass(redis.Redis):
+        def some_method():
+            pass
+        or
+        @redis_conn_retry_deco(policy=RedisRetryPolicy(max_retries=5))
+        async def some_method():
             pass
     """
 
-    def wrapper(*args, **kwargs):
-        deco_tries = 1
-        last_err = None
-        sleep_time = REDIS_CONN_SLEEP_TIME
+    if func is None:
+        return functools.partial(redis_conn_retry_deco, policy=policy)
 
-        while deco_tries <= REDIS_CONN_RETRY_MAX:
-            try:
-                result = func(*args, **kwargs)
-                return result
-            except (redis.exceptions.ConnectionError, redis.exceptions.BusyLoadingError) as err:
-                logger.warning('Redis connection timeout. Going to sleep for {}s and retrying ({}/{})'.format(
-                    REDIS_CONN_SLEEP_TIME, deco_tries, REDIS_CONN_RETRY_MAX
-                ))
-                last_err = err
-                time.sleep(sleep_time)
-                deco_tries += 1
-                sleep_time += 5
-        raise last_err
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            return await (policy or default_retry_policy).call_async(func, *args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return (policy or default_retry_policy).call(func, *args, **kwargs)
 
     return wrapper
 
 
+def _command_size(args, kwargs):
+    """Approximate command payload size in bytes"""
+    size = 0
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, (bytes, str)):
+            size += len(value)
+        elif isinstance(value, dict):
+            size += _command_size(value.keys(), value)
+        elif isinstance(value, (list, tuple, set)):
+            size += _command_size(value, {})
+        else:
+            size += 8
+    return size
+
+
+class RedisBatchPipeline:
+    """Auto-flushing Redis pipeline
+
+    Args:
+        redis_conn (redis.Redis): Redis connection
+        max_commands (int): flush after this number of queued commands
+        max_bytes (int): flush after queued commands payload reaches this size
+        transaction (bool): wrap every batch in MULTI/EXEC
+
+    Note:
+        commands are buffered and every flush sends them in single pipeline execute();
+        on connection error the whole batch is sent again (see redis_conn_retry_deco),
+        so queued commands should be idempotent, eg. SET, HSET, EXPIRE, DEL;
+        only Redis commands can be queued, pipeline control methods (execute, multi, watch...) are not available;
+        when with block exits with exception, commands queued since the last flush are discarded
+
+    Example:
+        with fastcache.batch_pipeline(max_commands=500) as pipe:
+            for key, value in items:
+                pipe.set(key, value, ex=3600)
+        print(pipe.flushed_commands)
+    """
+
+    def __init__(self, redis_conn, max_commands=REDIS_BATCH_SIZE, max_bytes=REDIS_PIPELINE_MAX_BYTES,
+                 transaction=False):
+        self.redis_conn = redis_conn
+        self.max_commands = max_commands
+        self.max_bytes = max_bytes
+        self.transaction = transaction
+
+        self.commands = []
+        self.queued_bytes = 0
+        self.flushed_commands = 0
+
+    # pipeline control methods, also defined as Redis commands
+    control_methods = frozenset(['discard', 'execute', 'multi', 'reset', 'unwatch', 'watch'])
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def commands_names():
+        """Handles getting names of Redis commands which can be queued"""
+        return frozenset(
+            name for klass in redis.client.Pipeline.__mro__ if klass.__module__.startswith('redis.commands')
+            for name, value in vars(klass).items() if callable(value) and not name.startswith('_')
+        ) - RedisBatchPipeline.control_methods - REDIS_LOCAL_METHODS
+
+    def __getattr__(self, name):
+        if name not in self.commands_names():
+            raise AttributeError(name)
+
+        def queue_command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            self.queued_bytes += _command_size(args, kwargs)
+
+            if len(self.commands) >= self.max_commands or self.queued_bytes >= self.max_bytes:
+                self.flush()
+            return self
+
+        return queue_command
+
+    def __len__(self):
+        return len(self.commands)
+
+    @staticmethod
+    def _execute(redis_conn, commands, transaction):
+        # client is the first argument, so flush uses circuit breaker of its server
+        pipe = redis_conn.pipeline(transaction=transaction)
+        for name, args, kwargs in commands:
+            getattr(pipe, name)(*args, **kwargs)
+        return pipe.execute()
+
+    def flush(self):
+        """Send queued commands
+
+        Returns:
+            (list) commands results
+        """
+        if not self.commands:
+            return []
+
+        commands, self.commands, self.queued_bytes = self.commands, [], 0
+        results = redis_conn_retry_deco(self._execute)(self.redis_conn, commands, self.transaction)
+        self.flushed_commands += len(commands)
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            # do not send partial batch of failed block
+            self.commands, self.queued_bytes = [], 0
+
+
+def _disable_client_retry(client, retry):
+    """Handles turning off redis-py built-in retries, which would run inside every decorated attempt
+    and break retry policy deadline
+    """
+    connection_pool = client.connection_pool
+    connection_pool.connection_kwargs['retry'] = retry
+    try:
+        connection_pool.set_retry(retry)
+    except AttributeError:
+        # BlockingConnectionPool keeps created connections in single list
+        for connection in connection_pool._connections:
+            connection.retry = retry
+    if client.connection is not None:
+        client.connection.retry = retry
+
+
 @redis_deco_wrapper_class_decorator
 class RedisDecoWrapper(redis.Redis):
     """Redis wrapper
@@ -70,9 +451,163 @@ class RedisDecoWrapper(redis.Redis):
         as in original redis.Redis class
 
     Note:
-        main purpose of this class is decorate all Redis methods with retry connection wrapper
+        main purpose of this class is decorate all Redis methods with retry connection wrapper;
+        redis-py built-in retries of the connection pool are turned off, retry policy handles them;
+        bulk helpers (names with underscore, so not decorated per call) retry whole batches
+
+    Example:
+        values = fastcache.bulk_get(keys)
+        fastcache.bulk_set({'key': 'value'}, ex=3600)
     """
-    pass
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _disable_client_retry(self, Retry(NoBackoff(), 0))
+
+    def bulk_get(self, keys, batch_size=REDIS_BATCH_SIZE):
+        """Get many keys with MGET batches
+
+        Args:
+            keys (iter): keys
+            batch_size (int): keys per single MGET
+
+        Returns:
+            (list) values in keys order, None for missing keys
+        """
+        keys = list(keys)
+        values = []
+        for offset in range(0, len(keys), batch_size):
+            values.extend(self.mget(keys[offset:offset + batch_size]))
+        return values
+
+    def bulk_get_dict(self, keys, batch_size=REDIS_BATCH_SIZE):
+        """Get many keys with MGET batches
+
+        Returns:
+            (dict) key -> value, only existing keys
+        """
+        keys = list(keys)
+        return {key: value for key, value in zip(keys, self.bulk_get(keys, batch_size)) if value is not None}
+
+    def bulk_set(self, mapping, ex=None, batch_size=REDIS_BATCH_SIZE):
+        """Set many keys with MSET batches, or pipelined SET batches when expiration is given
+
+        Args:
+            mapping (dict): key -> value
+            ex (int): expiration in seconds
+            batch_size (int): keys per single round trip
+        """
+        items = list(mapping.items())
+
+        if ex is None:
+            for offset in range(0, len(items), batch_size):
+                self.mset(dict(items[offset:offset + batch_size]))
+            return
+
+        with self.batch_pipeline(max_commands=batch_size) as pipe:
+            for key, value in items:
+                pipe.set(key, value, ex=ex)
+
+    def bulk_delete(self, keys, batch_size=REDIS_BATCH_SIZE):
+        """Delete many keys with DEL batches
+
+        Returns:
+            (int) number of removed keys
+        """
+        keys = list(keys)
+        return sum(self.delete(*keys[offset:offset + batch_size]) for offset in range(0, len(keys), batch_size))
+
+    def batch_pipeline(self, max_commands=REDIS_BATCH_SIZE, max_bytes=REDIS_PIPELINE_MAX_BYTES, transaction=False):
+        """Auto-flushing pipeline, see RedisBatchPipeline"""
+        return RedisBatchPipeline(self, max_commands=max_commands, max_bytes=max_bytes, transaction=transaction)
+
+
+@redis_deco_wrapper_class_decorator
+class AsyncRedisDecoWrapper(redis.asyncio.Redis):
+    """Redis asyncio wrapper
+
+    Args:
+        as in original redis.asyncio.Redis class
+
+    Note:
+        all Redis methods are decorated with retry connection wrapper, retries sleep without blocking event loop;
+        redis-py built-in retries of the connection pool are turned off, retry policy handles them
+
+    Example:
+        fastcache = AsyncRedisDecoWrapper(host='127.0.0.1')
+        await fastcache.get('key')
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _disable_client_retry(self, redis.asyncio.retry.Retry(NoBackoff(), 0))
+
+
+# ============================== connection pools ==============================
+
+# process-wide pools keyed by (db_key, pid, settings)
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+
+def _reset_connection_pools():
+    """Handles dropping pools inherited from parent process, sockets are left for parent"""
+    global _connection_pools_lock
+    _connection_pools.clear()
+    _connection_pools_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_connection_pools)
+
+
+def get_connection_pool(settings_dict, db_key='default', max_connections=REDIS_POOL_MAX_CONNECTIONS,
+                        timeout=REDIS_POOL_TIMEOUT):
+    """Handles getting shared connection pool
+
+    Args:
+        settings_dict (dict): dict with DBs connection data
+        db_key (str): DB name as key from settings_dict
+        max_connections (int): max connections of new pool, 'max_connections' in DB settings takes precedence
+        timeout (float): seconds to wait for free connection, 'timeout' in DB settings takes precedence
+
+    Returns:
+        (redis.BlockingConnectionPool) one pool per DB settings and process
+
+    Note:
+        pools are created once per process, so forked workers never share sockets with parent;
+        close them with close_connection_pools(), called at interpreter exit as well
+    """
+    db_settings = settings_dict.get(db_key)
+    key = (db_key, os.getpid(), tuple(sorted((name, repr(value)) for name, value in db_settings.items())))
+
+    pool = _connection_pools.get(key)
+    if pool is None:
+        with _connection_pools_lock:
+            pool = _connection_pools.get(key)
+            if pool is None:
+                options = {'max_connections': max_connections, 'timeout': timeout}
+                options.update(db_settings)
+                pool = _connection_pools[key] = redis.BlockingConnectionPool(**options)
+    return pool
+
+
+def close_connection_pools():
+    """Handles disconnecting and dropping all shared pools of the current process
+
+    Example:
+        # on worker shutdown
+        close_connection_pools()
+    """
+    with _connection_pools_lock:
+        pools = [pool for key, pool in _connection_pools.items() if key[1] == os.getpid()]
+        _connection_pools.clear()
+
+    for pool in pools:
+        pool.disconnect()
+
+
+atexit.register(close_connection_pools)
 
 
 class RedisConn:
@@ -81,9 +616,12 @@ class RedisConn:
     Args:
         settings (dict): dict with DBs connection data
         db_key (str): DB name as key from REDIS_DATABASES dict
+        max_connections (int): max connections of shared pool
 
     Note:
-        implemented as context manager
+        implemented as context manager;
+        connections come from process-wide pool (see get_connection_pool), so they are reused by next
+        RedisConn with the same settings and are not disconnected on exit
 
     Example:
         REDIS_DATABASES = {
@@ -97,12 +635,13 @@ class RedisConn:
             fastcache.something()
     """
 
-    def __init__(self, settings_dict, db_key='default'):
-        self.r_conn = redis.ConnectionPool(**settings_dict.get(db_key))
+    def __init__(self, settings_dict, db_key='default', max_connections=REDIS_POOL_MAX_CONNECTIONS):
+        self.r_conn = get_connection_pool(settings_dict, db_key, max_connections=max_connections)
         self.fastcache = RedisDecoWrapper(connection_pool=self.r_conn)
 
     def __enter__(self):
         return self.fastcache
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.r_conn.disconnect()
+        # connections are released to shared pool by each command, pool is closed by close_connection_pools()
+        pass
@@ -0,0 +1,244 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .redis import RedisConn
+
+# in-process tier: max number of keys and seconds after which key is read from Redis again
+REDIS_CACHE_MAX_SIZE = 10000
+REDIS_CACHE_LOCAL_TTL = 5
+
+# pub/sub channel used to drop keys from in-process tiers of all processes
+REDIS_CACHE_CHANNEL = 'redis_cache:invalidate'
+
+
+class RedisReadThroughCache:
+    """Two-tier read-through cache: in-process LRU with TTL in front of Redis
+
+    Args:
+        settings_dict (dict): dict with DBs connection data, as in RedisConn
+        db_key (str): DB name as key from settings_dict
+        max_size (int): max number of keys kept in process, least recently used are dropped first
+        ttl (float): seconds after which key kept in process is read from Redis again
+        channel (str): pub/sub channel for invalidation messages
+        listen (bool): start invalidation listener thread
+
+    Note:
+        values are returned as read from Redis (bytes unless decode_responses is set),
+        missing keys are not kept in process;
+        set() and delete() publish changed keys and every cache listening on the channel drops them,
+        so other processes read new value on next get(); ttl bounds staleness when message is lost
+        (eg. listener reconnect), so keep it short for keys changed outside of this class
+
+    Example:
+        cache = RedisReadThroughCache(REDIS_DATABASES, ttl=10)
+        cache.get('user:1', loader=lambda key: load_user(key), ex=3600)
+        cache.set('user:1', b'...')
+        cache.stats()
+        cache.close()
+    """
+
+    def __init__(self, settings_dict, db_key='default', max_size=REDIS_CACHE_MAX_SIZE, ttl=REDIS_CACHE_LOCAL_TTL,
+                 channel=REDIS_CACHE_CHANNEL, listen=True):
+        self.fastcache = RedisConn(settings_dict, db_key).fastcache
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel = channel
+
+        # own messages are skipped, local tier is already up to date
+        self.instance_id = uuid.uuid4().hex
+        self.local = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped on every invalidation, values read from Redis before it are not kept in process
+        self._generation = 0
+        self._stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'loads': 0, 'invalidations': 0}
+
+        self._pubsub = None
+        self._listener = None
+        if listen:
+            self.start_listener()
+
+    # ============================== in-process tier ==============================
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self.local.get(key)
+            if entry is None:
+                return None, self._generation
+
+            if entry[0] <= time.monotonic():
+                del self.local[key]
+                return None, self._generation
+
+            self.local.move_to_end(key)
+            self._stats['local_hits'] += 1
+            return entry, self._generation
+
+    def _local_set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self.local[key] = (time.monotonic() + self.ttl, value)
+            self.local.move_to_end(key)
+            while len(self.local) > self.max_size:
+                self.local.popitem(last=False)
+
+    def invalidate_local(self, keys=None):
+        """Handles dropping keys from in-process tier, all keys when not given"""
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += 1
+            if keys is None:
+                self.local.clear()
+            else:
+                for key in keys:
+                    self.local.pop(key, None)
+
+    # ============================== invalidation ==============================
+
+    def _on_message(self, message):
+        data = message['data']
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+
+        instance_id, _, key = data.partition(':')
+        if instance_id != self.instance_id:
+            self.invalidate_local([key])
+
+    def _publish(self, keys):
+        for key in keys:
+            self.fastcache.publish(self.channel, '{}:{}'.format(self.instance_id, key))
+
+    def start_listener(self):
+        """Handles starting invalidation listener thread"""
+        if self._listener is not None:
+            return
+
+        self._pubsub = self.fastcache.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: self._on_message})
+        self._listener = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def close(self):
+        """Handles stopping invalidation listener"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # ============================== cache ==============================
+
+    def get(self, key, loader=None, ex=None):
+        """Handles reading key through both tiers
+
+        Args:
+            key (str): Redis key
+            loader (callable): called with key when key is missing in Redis, result is stored in both tiers
+            ex (int): Redis expiry in seconds of loaded value
+
+        Returns:
+            (bytes) value or None
+        """
+        entry, generation = self._local_get(key)
+        if entry is not None:
+            return entry[1]
+
+        value = self.fastcache.get(key)
+        if value is not None:
+            self._count('redis_hits')
+            self._local_set(key, value, generation)
+            return value
+
+        self._count('misses')
+        if loader is None:
+            return None
+
+        value = loader(key)
+        self._count('loads')
+        if value is None:
+            return None
+        return self.set(key, value, ex=ex)
+
+    def get_many(self, keys):
+        """Handles reading keys through both tiers, missing in process are read from Redis at once
+
+        Returns:
+            (dict) key -> value, missing keys are skipped
+        """
+        result = {}
+        missing = []
+        generation = None
+
+        for key in keys:
+            entry, key_generation = self._local_get(key)
+            if entry is not None:
+                result[key] = entry[1]
+            else:
+                missing.append(key)
+                generation = key_generation if generation is None else generation
+
+        if missing:
+            for key, value in zip(missing, self.fastcache.bulk_get(missing)):
+                if value is None:
+                    self._count('misses')
+                    continue
+
+                self._count('redis_hits')
+                self._local_set(key, value, generation)
+                result[key] = value
+        return result
+
+    def set(self, key, value, ex=None):
+        """Handles writing key to Redis and in-process tier, other processes drop their copies
+
+        Returns:
+            value as it would be read back from Redis
+        """
+        self.fastcache.set(key, value, ex=ex)
+        with self._lock:
+            self._generation += 1
+        encoder = self.fastcache.get_encoder()
+        value = encoder.decode(encoder.encode(value))
+        self._local_set(key, value)
+        self._publish([key])
+        return value
+
+    def delete(self, *keys):
+        """Handles deleting keys from both tiers of all processes
+
+        Returns:
+            (int) number of keys deleted from Redis
+        """
+        deleted = self.fastcache.delete(*keys)
+        self.invalidate_local(keys)
+        self._publish(keys)
+        return deleted
+
+    # ============================== stats ==============================
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """Handles getting hit/miss statistics
+
+        Returns:
+            (dict) local_hits, redis_hits, misses, loads, invalidations, local_size and hit ratios
+        """
+        with self._lock:
+            stats = dict(self._stats, local_size=len(self.local))
+
+        reads = stats['local_hits'] + stats['redis_hits'] + stats['misses']
+        stats['local_hit_ratio'] = stats['local_hits'] / reads if reads else 0.0
+        stats['hit_ratio'] = (stats['local_hits'] + stats['redis_hits']) / reads if reads else 0.0
+        return stats